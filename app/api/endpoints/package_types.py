@@ -1,35 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
+from fastapi import APIRouter, HTTPException, Header, Response as HTTPResponse
 
-from app.db.session import get_db
-from app.models.package_type import PackageType
 from app.schemas.package_type import PackageType as PackageTypeSchema
 from app.schemas.response import Response
+from app.services.package_type import package_type_catalog
 from app.utils.logging import app_logger as logger
 
 router = APIRouter()
 
 
+def _not_modified(etag: str, if_none_match: str | None) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
 @router.get("/", response_model=Response[list[PackageTypeSchema]])
 async def get_package_types(
-        db: AsyncSession = Depends(get_db),
+        response: HTTPResponse,
+        if_none_match: str | None = Header(None),
 ):
     """
     Получает список всех типов посылок.
+    Данные отдаются из справочника в памяти; поддерживается ETag / If-None-Match.
     """
     logger.info("Request for all package types")
 
     try:
-        result = await db.execute(select(PackageType))
-        package_types = result.scalars().all()
+        package_types = await package_type_catalog.get_all()
+        etag = package_type_catalog.etag
+
+        if _not_modified(etag, if_none_match):
+            return HTTPResponse(status_code=304, headers={"ETag": etag})
 
+        response.headers["ETag"] = etag
         return Response(
             success=True,
             message="Типы посылок успешно получены",
-            data=[
-                PackageTypeSchema.model_validate(pt) for pt in package_types
-            ]
+            data=package_types
         )
     except Exception as e:
         logger.error(f"Error retrieving package types: {str(e)}")
@@ -39,27 +46,31 @@ async def get_package_types(
 @router.get("/{package_type_id}", response_model=Response[PackageTypeSchema])
 async def get_package_type(
         package_type_id: int,
-        db: AsyncSession = Depends(get_db),
+        response: HTTPResponse,
+        if_none_match: str | None = Header(None),
 ):
     """
     Получает информацию о конкретном типе посылки по ID.
+    Данные отдаются из справочника в памяти; поддерживается ETag / If-None-Match.
     """
     logger.info(f"Request for package type ID: {package_type_id}")
 
     try:
-        result = await db.execute(
-            select(PackageType).where(PackageType.id == package_type_id)
-        )
-        package_type = result.scalars().first()
+        package_type = await package_type_catalog.get(package_type_id)
 
         if not package_type:
             logger.warning(f"Package type ID {package_type_id} not found")
             raise HTTPException(status_code=404, detail="Тип посылки не найден")
 
+        etag = await package_type_catalog.get_etag(package_type_id)
+        if _not_modified(etag, if_none_match):
+            return HTTPResponse(status_code=304, headers={"ETag": etag})
+
+        response.headers["ETag"] = etag
         return Response(
             success=True,
             message="Тип посылки успешно получен",
-            data=PackageTypeSchema.model_validate(package_type)
+            data=package_type
         )
     except HTTPException:
         raise
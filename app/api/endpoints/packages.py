@@ -1,29 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Literal, Sequence
+
+import pydantic_core
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response as HTTPResponse
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 
+from app.core.config import settings
 from app.core.session import get_or_create_session
-from app.db.session import get_db
-from app.models.package import Package
-from app.models.package_type import PackageType
+from app.db.routing import async_replica_session
+from app.db.session import get_db, get_read_db, get_replica_db
 from app.models.user_session import UserSession
 from app.schemas.package import (
     Package as PackageSchema,
     PackageCreate,
     PackageFilter,
     PackageAssignCompany,
+    PackageClaim,
 )
-from app.schemas.response import Response, PaginatedResponse, PackageCreateResponse
+from app.schemas.response import Response, PaginatedResponse, CursorPaginatedResponse, PackageCreateResponse
+from app.services.id_allocator import package_id_allocator
 from app.services.package import (
-    get_package,
+    get_package_detail,
     get_packages,
+    get_packages_after,
+    stream_packages,
+    serialize_package_row,
+    PACKAGE_EXPORT_COLUMNS,
+    encode_cursor,
+    decode_cursor,
     assign_shipping_company,
+    claim_packages,
 )
+from app.services.package_events import listen_package_events
+from app.services.package_type import package_type_catalog
 from app.utils.logging import app_logger as logger
+from app.utils.ndjson import BodyTooLarge, ItemTooLarge, iter_json_array, iter_ndjson_lines, limit_body
 from app.workers.package_processor import send_package_to_queue
 
 router = APIRouter()
 
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+BULK_MAX_ERRORS = 100
+
 
 @router.post(
     "/",
@@ -32,29 +55,27 @@ router = APIRouter()
 )
 async def register_package(
         package_data: PackageCreate,
-        db: AsyncSession = Depends(get_db),
         user_session: UserSession = Depends(get_or_create_session),
 ):
     """
     Регистрирует новую посылку и отправляет ее в очередь для расчета стоимости доставки.
+    ID посылки выдается сразу, сама посылка появляется в базе после обработки воркером.
     """
     logger.info(f"Registering new package: {package_data.name}")
 
     try:
-        result = await db.execute(
-            select(PackageType).where(PackageType.id == package_data.package_type_id)
-        )
-        package_type = result.scalars().first()
-
-        if not package_type:
+        if not await package_type_catalog.exists(package_data.package_type_id):
             logger.warning(f"Package type ID {package_data.package_type_id} not found")
             raise HTTPException(
                 status_code=404,
                 detail=f"Тип посылки с ID {package_data.package_type_id} не найден"
             )
 
+        package_id = (await package_id_allocator.allocate(1))[0]
+
         message_data = {
             "package_data": {
+                "package_id": package_id,
                 "name": package_data.name,
                 "weight": package_data.weight,
                 "price_usd": package_data.price_usd,
@@ -74,7 +95,7 @@ async def register_package(
         return PackageCreateResponse(
             success=True,
             message="Посылка успешно отправлена на обработку",
-            data={"status": "processing"}
+            data={"package_id": package_id, "status": "processing"}
         )
 
     except HTTPException:
@@ -84,20 +105,173 @@ async def register_package(
         raise HTTPException(status_code=500, detail="Ошибка при регистрации посылки")
 
 
+@router.post(
+    "/bulk",
+    response_model=PackageCreateResponse,
+    status_code=201
+)
+async def register_packages_bulk(
+        request: Request,
+        user_session: UserSession = Depends(get_or_create_session),
+):
+    """
+    Регистрирует пачку посылок и отправляет их в очередь для расчета стоимости доставки.
+
+    Принимает JSON-массив посылок или поток NDJSON (Content-Type: application/x-ndjson);
+    оба разбираются и проверяются поэлементно по мере чтения. Тело ограничено
+    BULK_MAX_BODY_BYTES, одна посылка - BULK_MAX_ITEM_BYTES. Корректные посылки публикуются
+    сообщениями по BULK_PUBLISH_BATCH_SIZE штук только после чтения всего запроса,
+    поэтому запрос сверх BULK_MAX_PACKAGES (считаются и некорректные посылки) не создает
+    посылок. Некорректные посылки пропускаются и перечисляются в ответе. ID принятых посылок возвращаются
+    в порядке следования, в том числе в ошибке, если отправка прервалась на середине.
+    """
+    logger.info(f"Bulk registering packages for session {user_session.session_id}")
+
+    try:
+        package_type_ids = await package_type_catalog.ids()
+
+        received = 0
+        rejected = 0
+        errors = []
+        items = []
+
+        async for line_no, package_data in _iter_bulk_items(request):
+            # Лимит проверяется до публикации: отклоненный запрос не создает ни одной посылки
+            received += 1
+            if received > settings.BULK_MAX_PACKAGES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Превышено максимальное количество посылок в запросе: {settings.BULK_MAX_PACKAGES}"
+                )
+
+            try:
+                if isinstance(package_data, bytes):
+                    package_in = PackageCreate.model_validate_json(package_data)
+                else:
+                    package_in = PackageCreate.model_validate(package_data)
+                details = None
+                if package_in.package_type_id not in package_type_ids:
+                    details = f"Тип посылки с ID {package_in.package_type_id} не найден"
+            except ValidationError as e:
+                details = e.errors(include_url=False, include_context=False, include_input=False)
+
+            if details is not None:
+                rejected += 1
+                if len(errors) < BULK_MAX_ERRORS:
+                    errors.append({"line": line_no, "errors": details})
+                continue
+
+            items.append({
+                **package_in.model_dump(),
+                "user_session_id": user_session.id
+            })
+
+        package_ids = []
+        for start in range(0, len(items), settings.BULK_PUBLISH_BATCH_SIZE):
+            batch = items[start:start + settings.BULK_PUBLISH_BATCH_SIZE]
+            try:
+                ids = await package_id_allocator.allocate(len(batch))
+                for item, package_id in zip(batch, ids):
+                    item["package_id"] = package_id
+
+                success = await send_package_to_queue({"packages_data": batch}, routing_key="package.create")
+            except Exception as e:
+                logger.error(f"Error publishing bulk batch: {str(e)}")
+                success = False
+
+            if not success:
+                # Уже отправленные посылки будут созданы: их ID возвращаются,
+                # чтобы при повторе клиент отправил только оставшиеся
+                raise HTTPException(
+                    status_code=500,
+                    detail={
+                        "message": "Ошибка при отправке данных в очередь обработки",
+                        "accepted": len(package_ids),
+                        "package_ids": package_ids,
+                    }
+                )
+            package_ids.extend(ids)
+
+        accepted = len(package_ids)
+
+        if not accepted:
+            raise HTTPException(
+                status_code=422,
+                detail={"message": "Не найдено ни одной корректной посылки", "errors": errors}
+            )
+
+        logger.info(f"Bulk registration: accepted {accepted}, rejected {rejected}")
+
+        return PackageCreateResponse(
+            success=True,
+            message="Посылки успешно отправлены на обработку",
+            data={
+                "status": "processing",
+                "accepted": accepted,
+                "rejected": rejected,
+                "package_ids": package_ids,
+                "errors": errors,
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk registering packages: {str(e)}")
+        raise HTTPException(status_code=500, detail="Ошибка при регистрации посылок")
+
+
+async def _iter_bulk_items(request: Request) -> AsyncIterator[tuple[int, Any]]:
+    """
+    Перебирает посылки из тела запроса по мере чтения: построчно для NDJSON
+    (с номером строки) или поэлементно для JSON-массива (с номером элемента).
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.BULK_MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail=f"Тело запроса больше {settings.BULK_MAX_BODY_BYTES} байт")
+
+    chunks = limit_body(request.stream(), settings.BULK_MAX_BODY_BYTES)
+    content_type = request.headers.get("content-type", "")
+
+    try:
+        if content_type.startswith(NDJSON_CONTENT_TYPES):
+            async for line_no, line in iter_ndjson_lines(chunks, settings.BULK_MAX_ITEM_BYTES):
+                yield line_no, line
+        else:
+            async for index, item in iter_json_array(chunks, settings.BULK_MAX_ITEM_BYTES):
+                yield index, item
+    except (BodyTooLarge, ItemTooLarge) as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректный JSON в теле запроса: {str(e)}")
+
+
+def _json_response(payload: dict[str, Any]) -> HTTPResponse:
+    # Ответ уже соответствует response_model, повторная валидация FastAPI не нужна
+    return HTTPResponse(content=pydantic_core.to_json(payload), media_type="application/json")
+
+
 @router.get(
     "/",
-    response_model=PaginatedResponse[PackageSchema]
+    response_model=PaginatedResponse[PackageSchema] | CursorPaginatedResponse[PackageSchema]
 )
 async def list_packages(
         page: int = Query(1, ge=1, description="Номер страницы"),
         page_size: int = Query(10, ge=1, le=100, description="Размер страницы"),
         package_type_id: int | None = Query(None, description="Фильтр по типу посылки"),
         has_shipping_cost: bool | None = Query(None, description="Фильтр по наличию рассчитанной стоимости доставки"),
-        db: AsyncSession = Depends(get_db),
+        cursor: str | None = Query(
+            None,
+            description="Курсор страницы (next_cursor из предыдущего ответа); пустое значение - первая страница"
+        ),
+        with_total: bool = Query(False, description="Вернуть общее количество посылок в режиме курсора"),
+        db: AsyncSession = Depends(get_replica_db),
         user_session: UserSession = Depends(get_or_create_session),
 ):
     """
     Получает список посылок с пагинацией и фильтрацией.
+    Если передан параметр cursor, используется пагинация по курсору:
+    параметр page игнорируется, а общее количество считается только при with_total.
     """
     logger.info(f"Listing packages for session {user_session.session_id}, page {page}, size {page_size}")
 
@@ -110,6 +284,30 @@ async def list_packages(
                 has_shipping_cost=has_shipping_cost
             )
 
+        if cursor is not None:
+            try:
+                after_id = decode_cursor(cursor) if cursor else None
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+            packages, next_after_id, total = await get_packages_after(
+                db=db,
+                user_session=user_session,
+                after_id=after_id,
+                limit=page_size,
+                filters=filters,
+                with_total=with_total
+            )
+
+            return _json_response({
+                "success": True,
+                "message": "Список посылок успешно получен",
+                "data": [serialize_package_row(row) for row in packages],
+                "next_cursor": encode_cursor(next_after_id) if next_after_id is not None else None,
+                "size": page_size,
+                "total": total,
+            })
+
         skip = (page - 1) * page_size
 
         packages, total = await get_packages(
@@ -122,47 +320,157 @@ async def list_packages(
 
         total_pages = (total + page_size - 1) // page_size
 
-        return PaginatedResponse(
-            success=True,
-            message="Список посылок успешно получен",
-            data=[PackageSchema.model_validate(x) for x in packages],
-            total=total,
-            page=page,
-            size=page_size,
-            pages=total_pages
-        )
+        return _json_response({
+            "success": True,
+            "message": "Список посылок успешно получен",
+            "data": [serialize_package_row(row) for row in packages],
+            "total": total,
+            "page": page,
+            "size": page_size,
+            "pages": total_pages,
+        })
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing packages: {str(e)}")
         raise HTTPException(status_code=500, detail="Ошибка при получении списка посылок")
 
 
+EXPORT_FIELDS = [column.key for column in PACKAGE_EXPORT_COLUMNS]
+
+
+async def _export_ndjson(partitions: AsyncIterator[Sequence[Row]]) -> AsyncIterator[bytes]:
+    async for partition in partitions:
+        yield b"".join(pydantic_core.to_json(row._asdict()) + b"\n" for row in partition)
+
+
+async def _export_csv(partitions: AsyncIterator[Sequence[Row]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+
+    async for partition in partitions:
+        writer.writerows(partition)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def _stream_export(
+        user_session: UserSession,
+        filters: PackageFilter | None,
+        export_format: str,
+) -> AsyncIterator[bytes]:
+    # Сессия зависимости get_db закрывается до отправки тела ответа,
+    # поэтому курсор выгрузки открывается в собственной сессии
+    async with async_replica_session() as db:
+        partitions = stream_packages(db, user_session, filters, settings.EXPORT_PARTITION_SIZE)
+        encoder = _export_csv if export_format == "csv" else _export_ndjson
+        try:
+            async for chunk in encoder(partitions):
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error exporting packages for session {user_session.session_id}: {str(e)}")
+            raise
+
+
+@router.get("/export")
+async def export_packages(
+        export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format", description="Формат выгрузки"),
+        package_type_id: int | None = Query(None, description="Фильтр по типу посылки"),
+        has_shipping_cost: bool | None = Query(None, description="Фильтр по наличию рассчитанной стоимости доставки"),
+        user_session: UserSession = Depends(get_or_create_session),
+):
+    """
+    Выгружает все посылки сессии в формате NDJSON или CSV.
+    Строки читаются из базы серверным курсором и отправляются по мере чтения,
+    поэтому потребление памяти не зависит от количества посылок.
+    """
+    logger.info(f"Exporting packages for session {user_session.session_id} as {export_format}")
+
+    filters = None
+    if package_type_id is not None or has_shipping_cost is not None:
+        filters = PackageFilter(
+            package_type_id=package_type_id,
+            has_shipping_cost=has_shipping_cost
+        )
+
+    media_type = "text/csv; charset=utf-8" if export_format == "csv" else "application/x-ndjson"
+    extension = "csv" if export_format == "csv" else "ndjson"
+
+    return StreamingResponse(
+        _stream_export(user_session, filters, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="packages.{extension}"'}
+    )
+
+
+async def _stream_events(request: Request, user_session: UserSession) -> AsyncIterator[bytes]:
+    yield b": connected\n\n"
+
+    async for event in listen_package_events(user_session.id, settings.PACKAGE_EVENTS_HEARTBEAT_INTERVAL):
+        if await request.is_disconnected():
+            break
+
+        if event is None:
+            yield b": keep-alive\n\n"
+        else:
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n".encode()
+
+
+@router.get("/events")
+async def package_events(
+        request: Request,
+        user_session: UserSession = Depends(get_or_create_session),
+):
+    """
+    Поток событий о посылках сессии (Server-Sent Events):
+    package.created - посылка зарегистрирована воркером,
+    package.cost_calculated - рассчитана стоимость доставки.
+    Заменяет опрос GET /packages/{package_id}.
+    """
+    logger.info(f"Client subscribed to package events for session {user_session.session_id}")
+
+    return StreamingResponse(
+        _stream_events(request, user_session),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get(
     "/{package_id}",
     response_model=Response[PackageSchema]
 )
 async def get_package_by_id(
         package_id: int,
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
         user_session: UserSession = Depends(get_or_create_session),
 ):
     """
     Получает данные о посылке по ее ID.
+    Данные отдаются из кэша Redis, который сбрасывается при расчете стоимости доставки.
+    Промахи кэша читаются с основной базы: с отстающей реплики в кэш
+    могли бы попасть данные, только что сброшенные воркером.
     """
     logger.info(f"Getting package with ID {package_id}")
 
     try:
-        package = await get_package(db, package_id, user_session)
+        package = await get_package_detail(db, package_id, user_session)
 
         if not package:
             logger.warning(f"Package with ID {package_id} not found for session {user_session.session_id}")
             raise HTTPException(status_code=404, detail="Посылка не найдена")
 
-        return Response(
-            success=True,
-            message="Данные о посылке успешно получены",
-            data=package
-        )
+        return _json_response({
+            "success": True,
+            "message": "Данные о посылке успешно получены",
+            "data": package,
+        })
 
     except HTTPException:
         raise
@@ -171,6 +479,42 @@ async def get_package_by_id(
         raise HTTPException(status_code=500, detail="Ошибка при получении данных о посылке")
 
 
+@router.post(
+    "/claim",
+    response_model=Response
+)
+async def claim_packages_for_company(
+        claim_data: PackageClaim,
+        db: AsyncSession = Depends(get_db),
+):
+    """
+    Закрепляет за транспортной компанией до limit свободных посылок
+    с рассчитанной стоимостью доставки.
+    Компании, забирающие посылки одновременно, получают разные посылки без ожидания блокировок.
+    """
+    logger.info(f"Company {claim_data.shipping_company_id} claims up to {claim_data.limit} packages")
+
+    try:
+        package_ids = await claim_packages(
+            db=db,
+            shipping_company_id=claim_data.shipping_company_id,
+            limit=claim_data.limit
+        )
+
+        return Response(
+            success=True,
+            message=f"За транспортной компанией закреплено посылок: {len(package_ids)}",
+            data={"package_ids": package_ids}
+        )
+
+    except Exception as e:
+        logger.error(f"Error claiming packages for company {claim_data.shipping_company_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Ошибка при закреплении посылок за транспортной компанией"
+        )
+
+
 @router.post(
     "/{package_id}/assign-company",
     response_model=Response
@@ -182,50 +526,34 @@ async def assign_company_to_package(
 ):
     """
     Привязывает посылку к транспортной компании.
-    Учитывает конкуренцию за посылку между компаниями.
+    Учитывает конкуренцию за посылку между компаниями: привязка и проверка
+    текущей компании выполняются одним атомарным запросом.
+    Повторная привязка к той же компании считается успешной.
     """
     logger.info(f"Assigning company {company_data.shipping_company_id} to package {package_id}")
 
     try:
-        result = await db.execute(
-            select(Package).where(Package.id == package_id)
-        )
-        package = result.scalars().first()
-
-        if not package:
-            logger.warning(f"Package with ID {package_id} not found")
-            raise HTTPException(status_code=404, detail="Посылка не найдена")
-
-        success = await assign_shipping_company(
+        owner_id = await assign_shipping_company(
             db=db,
             package_id=package_id,
             shipping_company_id=company_data.shipping_company_id
         )
 
-        if success:
-            return Response(
-                success=True,
-                message="Посылка успешно привязана к транспортной компании"
-            )
-        else:
-            result = await db.execute(
-                select(Package).where(Package.id == package_id)
+        if owner_id is None:
+            logger.warning(f"Package with ID {package_id} not found")
+            raise HTTPException(status_code=404, detail="Посылка не найдена")
+
+        if owner_id != company_data.shipping_company_id:
+            logger.warning(f"Package {package_id} already assigned to company {owner_id}")
+            raise HTTPException(
+                status_code=409,
+                detail=f"Посылка уже привязана к транспортной компании {owner_id}"
             )
-            updated_package = result.scalars().first()
 
-            if updated_package.shipping_company_id:
-                logger.warning(
-                    f"Package {package_id} already assigned to company {updated_package.shipping_company_id}"
-                )
-                raise HTTPException(
-                    status_code=409,
-                    detail=f"Посылка уже привязана к транспортной компании {updated_package.shipping_company_id}"
-                )
-            else:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Не удалось привязать посылку к транспортной компании"
-                )
+        return Response(
+            success=True,
+            message="Посылка успешно привязана к транспортной компании"
+        )
 
     except HTTPException:
         raise
@@ -1,13 +1,12 @@
 import uuid
-from datetime import datetime, timezone
 
 from fastapi import Depends, Cookie, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 
 from app.core.config import settings
 from app.db.session import get_db
 from app.models.user_session import UserSession
+from app.services.user_session import activity_tracker, resolve_session_id, remember_session
 
 
 async def get_or_create_session(
@@ -17,6 +16,9 @@ async def get_or_create_session(
 ) -> UserSession:
     """
     Получает существующую сессию пользователя или создает новую.
+    Существующая сессия ищется через кэш и возвращается как объект,
+    не привязанный к сессии базы данных (заполнены только id и session_id).
+    Время ее активности записывается отложенно.
     
     Args:
         request: Запрос FastAPI
@@ -27,23 +29,17 @@ async def get_or_create_session(
         UserSession: Объект сессии пользователя
     """
     if session_id:
-        result = await db.execute(
-            select(UserSession).where(UserSession.session_id == session_id)
-        )
-        session = result.scalars().first()
+        user_session_id = await resolve_session_id(db, session_id)
 
-        if session:
-            session.last_activity = datetime.now(timezone.utc)
-            db.add(session)
-            await db.commit()
-            await db.refresh(session)
-            return session
+        if user_session_id is not None:
+            activity_tracker.touch(user_session_id)
+            return UserSession(id=user_session_id, session_id=session_id)
 
     new_session_id = str(uuid.uuid4())
     new_session = UserSession(session_id=new_session_id)
     db.add(new_session)
     await db.commit()
-    await db.refresh(new_session)
+    await remember_session(new_session_id, new_session.id)
 
     response = request.scope.get("fastapi_response")
     if response:
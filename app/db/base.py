@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 from sqlalchemy.orm import DeclarativeBase
 
 from app.core.config import settings
+from app.db.pool import pool_options, register_pool_metrics
 
 convention = {
     "ix": "ix__%(column_0_label)s",
@@ -22,8 +23,27 @@ engine = create_async_engine(
     settings.SQLALCHEMY_DATABASE_URI,
     echo=False,
     future=True,
+    **pool_options("primary"),
 )
+register_pool_metrics(engine, "primary")
 
 async_session = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+
+# Сессии только для чтения: соединения в режиме AUTOCOMMIT, каждый запрос
+# выполняется в собственной транзакции, BEGIN/COMMIT на сервер не отправляются.
+# Отдельный пул: режим задается один раз при подключении, а не переключается
+# при каждой выдаче и возврате соединения общего пула
+read_engine = create_async_engine(
+    settings.SQLALCHEMY_DATABASE_URI,
+    echo=False,
+    future=True,
+    isolation_level="AUTOCOMMIT",
+    **pool_options("primary_read"),
+)
+register_pool_metrics(read_engine, "primary_read")
+
+async_read_session = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+)
@@ -0,0 +1,93 @@
+import time
+from typing import Any
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.utils.metrics import Counter, Gauge, Histogram
+
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Время получения соединения из пула, включая открытие нового соединения",
+    labelnames=("pool",)
+)
+pool_checkout_timeouts = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Количество превышений DB_POOL_TIMEOUT при получении соединения из пула",
+    labelnames=("pool",)
+)
+pool_size = Gauge("db_pool_size", "Размер пула соединений", labelnames=("pool",))
+pool_checked_out = Gauge("db_pool_checked_out", "Количество выданных соединений пула", labelnames=("pool",))
+pool_checked_in = Gauge("db_pool_checked_in", "Количество свободных соединений в пуле", labelnames=("pool",))
+pool_overflow = Gauge(
+    "db_pool_overflow",
+    "Количество соединений сверх pool_size (отрицательное - еще не открытые соединения пула)",
+    labelnames=("pool",)
+)
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, записывающий время ожидания соединения в метрики.
+    Метка пула задается в подклассе (см. instrumented_pool_class), чтобы она
+    сохранялась при пересоздании пула через recreate().
+    """
+
+    label = "default"
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_checkout_timeouts.inc(pool=self.label)
+            raise
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started, pool=self.label)
+
+
+def instrumented_pool_class(label: str) -> type[InstrumentedAsyncPool]:
+    return type(f"InstrumentedAsyncPool[{label}]", (InstrumentedAsyncPool,), {"label": label})
+
+
+def pool_options(label: str) -> dict[str, Any]:
+    """
+    Параметры пула соединений для create_async_engine с учетом роли процесса:
+    API обслуживает много параллельных запросов, воркер - несколько пачек за раз.
+
+    Args:
+        label: Метка пула в метриках
+
+    Returns:
+        dict[str, Any]: Именованные аргументы create_async_engine
+    """
+    if settings.APP_ROLE == "worker":
+        size, overflow = settings.WORKER_DB_POOL_SIZE, settings.WORKER_DB_MAX_OVERFLOW
+    else:
+        size, overflow = settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
+
+    return dict(
+        poolclass=instrumented_pool_class(label),
+        pool_size=size,
+        max_overflow=overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+
+
+def register_pool_metrics(engine: AsyncEngine, label: str) -> None:
+    """
+    Публикует состояние пула соединений движка в метриках.
+    Пул читается в момент выдачи метрик, поэтому пересоздание пула учитывается.
+
+    Args:
+        engine: Асинхронный движок SQLAlchemy
+        label: Метка пула в метриках
+    """
+    pool_size.set_function(lambda: engine.pool.size(), pool=label)
+    pool_checked_out.set_function(lambda: engine.pool.checkedout(), pool=label)
+    pool_checked_in.set_function(lambda: engine.pool.checkedin(), pool=label)
+    pool_overflow.set_function(lambda: engine.pool.overflow(), pool=label)
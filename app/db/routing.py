@@ -0,0 +1,155 @@
+import asyncio
+import itertools
+
+from sqlalchemy import Select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base import read_engine
+from app.db.pool import pool_options, register_pool_metrics
+from app.utils.logging import app_logger as logger
+
+
+class ReplicaRouter:
+    """
+    Набор реплик MySQL для чтения с выбором по кругу среди исправных.
+
+    Исправность реплик проверяется в фоне раз в check_interval секунд по SHOW REPLICA STATUS:
+    реплика считается исправной, если репликация запущена и отставание не больше max_lag секунд.
+    Если исправных реплик нет (или они не настроены), чтение идет с основной базы.
+    """
+
+    def __init__(
+            self,
+            primary: AsyncEngine,
+            replica_uris: list[str],
+            check_interval: float = settings.DB_REPLICA_HEALTH_CHECK_INTERVAL,
+            check_timeout: float = settings.DB_REPLICA_HEALTH_CHECK_TIMEOUT,
+            max_lag: int = settings.DB_REPLICA_MAX_LAG,
+    ):
+        self.primary = primary
+        self.replicas = [
+            create_async_engine(
+                uri, echo=False, future=True, isolation_level="AUTOCOMMIT", **pool_options(f"replica{index}")
+            )
+            for index, uri in enumerate(replica_uris)
+        ]
+        for index, replica in enumerate(self.replicas):
+            register_pool_metrics(replica, f"replica{index}")
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.max_lag = max_lag
+        # До первой проверки в start() реплики не используются
+        self._healthy: list[AsyncEngine] = []
+        self._counter = itertools.count()
+        self._task: asyncio.Task | None = None
+
+    def choose(self) -> AsyncEngine:
+        """
+        Возвращает следующую исправную реплику или основную базу.
+        """
+        healthy = self._healthy
+        if not healthy:
+            return self.primary
+        return healthy[next(self._counter) % len(healthy)]
+
+    @staticmethod
+    async def _replication_lag(replica: AsyncEngine) -> int | None:
+        """
+        Возвращает отставание реплики в секундах или None, если репликация
+        остановлена или сервер не является репликой.
+        """
+        async with replica.connect() as connection:
+            status = (await connection.execute(text("SHOW REPLICA STATUS"))).mappings().first()
+        if status is None:
+            return None
+        if status["Replica_IO_Running"] != "Yes" or status["Replica_SQL_Running"] != "Yes":
+            return None
+        return status["Seconds_Behind_Source"]
+
+    async def _ping(self, replica: AsyncEngine) -> bool:
+        address = f"{replica.url.host}:{replica.url.port}"
+        try:
+            lag = await asyncio.wait_for(self._replication_lag(replica), self.check_timeout)
+        except Exception as e:
+            logger.warning(f"Database replica {address} is unavailable: {str(e)}")
+            return False
+
+        if lag is None:
+            logger.warning(f"Database replica {address} is not replicating")
+            return False
+        if lag > self.max_lag:
+            logger.warning(f"Database replica {address} lags {lag}s behind the source")
+            return False
+        return True
+
+    async def check(self) -> None:
+        """
+        Проверяет все реплики и обновляет список исправных.
+        """
+        results = await asyncio.gather(*(self._ping(replica) for replica in self.replicas))
+        healthy = [replica for replica, ok in zip(self.replicas, results) if ok]
+
+        if len(healthy) != len(self._healthy):
+            logger.info(f"Healthy database replicas: {len(healthy)} of {len(self.replicas)}")
+        self._healthy = healthy
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    async def start(self) -> None:
+        """
+        Проверяет реплики и запускает их периодическую проверку в фоне.
+        """
+        if self.replicas and self._task is None:
+            await self.check()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Останавливает проверку реплик и закрывает их пулы соединений.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.dispose()
+
+
+replica_router = ReplicaRouter(read_engine, settings.SQLALCHEMY_REPLICA_URIS)
+
+
+class ReplicaRoutingSession(Session):
+    """
+    Сессия, отправляющая SELECT без блокировок на реплики,
+    а все остальные запросы - на основную базу.
+    Реплика выбирается один раз на сессию, чтобы все запросы одного
+    HTTP-запроса (например, количество и страница списка) видели одни и те же данные.
+    """
+
+    _replica: AsyncEngine | None = None
+
+    def get_bind(self, mapper=None, clause=None, **kw) -> Engine:
+        if isinstance(clause, Select) and clause._for_update_arg is None and not self._flushing:
+            if self._replica is None:
+                self._replica = replica_router.choose()
+            return self._replica.sync_engine
+        return read_engine.sync_engine
+
+
+# Сессии чтения с реплик: данные могут отставать от основной базы,
+# поэтому они не используются там, где нужно сразу видеть свои изменения
+async_replica_session = async_sessionmaker(
+    class_=AsyncSession,
+    sync_session_class=ReplicaRoutingSession,
+    expire_on_commit=False,
+    autoflush=False,
+)
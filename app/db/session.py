@@ -2,7 +2,8 @@ from typing import AsyncGenerator
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.base import async_session
+from app.db.base import async_session, async_read_session
+from app.db.routing import async_replica_session
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -15,3 +16,22 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             raise
         finally:
             await session.close()
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Сессия для эндпоинтов, которые только читают данные.
+    Запросы выполняются в режиме AUTOCOMMIT: без flush и без COMMIT в конце запроса.
+    Разные запросы одной сессии могут видеть разные зафиксированные состояния.
+    """
+    async with async_read_session() as session:
+        yield session
+
+
+async def get_replica_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Сессия только для чтения, отправляющая SELECT на реплики.
+    Подходит для запросов, которым допустимо небольшое отставание данных.
+    """
+    async with async_replica_session() as session:
+        yield session
@@ -1,12 +1,19 @@
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 
 from app.api import api_router
 from app.core.config import settings
+from app.db.routing import replica_router
+from app.services.package_type import package_type_catalog
+from app.services.user_session import activity_tracker
+from app.utils.http import close_http_client, get_http_client
 from app.utils.logging import setup_logging, app_logger as logger
+from app.utils.metrics import render_metrics
+from app.utils.rabbitmq import publisher
 
 
 @asynccontextmanager
@@ -14,6 +21,22 @@ async def lifespan(app: FastAPI):
     setup_logging()
     logger.info("Starting Delivery Service API")
 
+    get_http_client()
+    activity_tracker.start()
+    await replica_router.start()
+
+    try:
+        await package_type_catalog.load()
+    except Exception as e:
+        # Справочник загрузится при первом обращении
+        logger.error(f"Failed to load package type catalog: {str(e)}")
+
+    try:
+        await publisher.connect()
+    except Exception as e:
+        # Издатель переподключится лениво при первой публикации
+        logger.error(f"Failed to connect publisher to RabbitMQ: {str(e)}")
+
     # worker_process = multiprocessing.Process(target=start_worker)
     # worker_process.start()
     # logger.info(f"Started package processor worker (PID: {worker_process.pid})")
@@ -23,6 +46,10 @@ async def lifespan(app: FastAPI):
     #     worker_process.join()
     #     logger.info("Stopped package processor worker")
     #
+    await activity_tracker.stop()
+    await replica_router.stop()
+    await publisher.close()
+    await close_http_client()
     logger.info("Delivery Service API stopped")
 
 
@@ -52,7 +79,11 @@ app.add_middleware(
 async def add_response_to_request(request: Request, call_next):
     response = Response()
     request.scope["fastapi_response"] = response
-    return await call_next(request)
+    result = await call_next(request)
+    # Cookie, установленные зависимостями (например, новой сессии), переносятся в настоящий ответ
+    for cookie in response.headers.getlist("set-cookie"):
+        result.headers.append("set-cookie", cookie)
+    return result
 
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -61,3 +92,8 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,9 +1,13 @@
+from .id_sequence import IdSequence
 from .package import Package
+from .package_counter import PackageCounter
 from .package_type import PackageType
 from .user_session import UserSession
 
 __all__ = [
+    'IdSequence',
     'Package',
+    'PackageCounter',
     'PackageType',
     'UserSession',
 ]
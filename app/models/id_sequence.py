@@ -0,0 +1,15 @@
+from sqlalchemy import String, BigInteger
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class IdSequence(Base):
+    """
+    Последовательность идентификаторов, из которой процессы резервируют
+    блоки ID (см. app.services.id_allocator). next_value - первый еще не выданный ID.
+    """
+    __tablename__ = "id_sequences"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    next_value: Mapped[int] = mapped_column(BigInteger, nullable=False)
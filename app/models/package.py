@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import String, Float, DateTime, ForeignKey, Boolean, Integer
+from sqlalchemy import String, Float, DateTime, ForeignKey, Boolean, Integer, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -8,6 +8,19 @@ from app.db.base import Base
 
 class Package(Base):
     __tablename__ = "packages"
+    __table_args__ = (
+        # Список посылок сессии: каждое сочетание фильтров по типу и состоянию расчета
+        # заканчивается ID, чтобы сортировка по ID шла по индексу
+        Index("ix__packages__session_id", "user_session_id", "id"),
+        Index("ix__packages__session_type_id", "user_session_id", "package_type_id", "id"),
+        Index(
+            "ix__packages__session_type_calculated_id",
+            "user_session_id", "package_type_id", "is_shipping_cost_calculated", "id"
+        ),
+        Index("ix__packages__session_calculated_id", "user_session_id", "is_shipping_cost_calculated", "id"),
+        # Поиск посылок без транспортной компании
+        Index("ix__packages__company_calculated_id", "shipping_company_id", "is_shipping_cost_calculated", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(200), index=True, nullable=False)
@@ -25,5 +38,6 @@ class Package(Base):
         DateTime, default=datetime.now, onupdate=datetime.now, nullable=False
     )
 
-    package_type: Mapped["PackageType"] = relationship("PackageType", back_populates="packages", lazy="selectin")
-    user_session: Mapped["UserSession"] = relationship("UserSession", back_populates="packages")
+    # Связи не загружаются неявно: нужные подгружаются опциями конкретного запроса
+    package_type: Mapped["PackageType"] = relationship("PackageType", back_populates="packages", lazy="raise")
+    user_session: Mapped["UserSession"] = relationship("UserSession", back_populates="packages", lazy="raise")
@@ -0,0 +1,18 @@
+from sqlalchemy import ForeignKey, Boolean, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class PackageCounter(Base):
+    """
+    Количество посылок сессии пользователя в разрезе типа посылки и состояния
+    расчета стоимости доставки. Поддерживается при создании посылок и расчете
+    стоимости, расхождения исправляются сверкой (app.workers.package_counters_reconcile).
+    """
+    __tablename__ = "package_counters"
+
+    user_session_id: Mapped[int] = mapped_column(ForeignKey("user_sessions.id"), primary_key=True)
+    package_type_id: Mapped[int] = mapped_column(ForeignKey("package_types.id"), primary_key=True)
+    is_shipping_cost_calculated: Mapped[bool] = mapped_column(Boolean, primary_key=True)
+    packages_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
@@ -12,5 +12,5 @@ class PackageType(Base):
     description: Mapped[str | None] = mapped_column(String(500), nullable=True)
 
     packages: Mapped[list["Package"]] = relationship(
-        "Package", back_populates="package_type", lazy="selectin"
+        "Package", back_populates="package_type", lazy="raise"
     )
@@ -15,5 +15,5 @@ class UserSession(Base):
     last_activity: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, nullable=False)
 
     packages: Mapped[list["Package"]] = relationship(
-        "Package", back_populates="user_session", lazy="selectin"
+        "Package", back_populates="user_session", lazy="raise"
     )
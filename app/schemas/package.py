@@ -40,6 +40,11 @@ class PackageAssignCompany(BaseModel):
     shipping_company_id: int = Field(..., gt=0)
 
 
+class PackageClaim(BaseModel):
+    shipping_company_id: int = Field(..., gt=0)
+    limit: int = Field(10, ge=1, le=100)
+
+
 class PackageInDB(PackageBase):
     model_config = ConfigDict(from_attributes=True)
     id: int
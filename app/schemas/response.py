@@ -29,6 +29,13 @@ class PaginatedResponse(ResponseBase, Generic[DataT]):
     pages: int
 
 
+class CursorPaginatedResponse(ResponseBase, Generic[DataT]):
+    data: list[DataT]
+    next_cursor: str | None = None
+    size: int
+    total: int | None = None
+
+
 class PackageCreateResponse(ResponseBase):
     model_config = ConfigDict(
         json_schema_extra={
@@ -1,38 +1,215 @@
+import time
+from dataclasses import dataclass
+
 import httpx
 
 from app.core.config import settings
-from app.utils.redis import get_cache, set_cache
+from app.utils.cache import StaleWhileRevalidate
+from app.utils.http import get_http_client
+from app.utils.logging import app_logger as logger
+from app.utils.metrics import Counter, Histogram
+from app.utils.rabbitmq import publisher
+from app.utils.redis import get_cache, set_cache, set_hash, redis_client
+
+CURRENCY_RATES_KEY = "currency:rates"
+CURRENCY_DATE_FIELD = "__date__"
+CURRENCY_LAST_RATE_KEY = "currency:usd_to_rub:last"
+
+currency_provider_latency = Histogram(
+    "currency_provider_request_seconds",
+    "Время ответа источника курсов валют",
+    labelnames=("provider",)
+)
+currency_provider_errors = Counter(
+    "currency_provider_errors_total",
+    "Количество неудачных запросов к источнику курсов валют",
+    labelnames=("provider",)
+)
 
-CURRENCY_CACHE_KEY = "currency:usd_to_rub"
+
+@dataclass(frozen=True)
+class CurrencySnapshot:
+    """
+    Курсы всех валют ЦБ на одну дату: сколько рублей стоит единица валюты.
+    """
+    date: str | None
+    rates: dict[str, float]
+
+
+async def get_currency_snapshot() -> CurrencySnapshot:
+    """
+    Получает текущие курсы всех валют.
+    Снимок хранится в памяти процесса и обновляется в фоне незадолго до
+    истечения CURRENCY_L1_TTL, поэтому большинство вызовов не обращаются
+    ни к Redis, ни к API. Резервный курс в памяти не сохраняется:
+    пока источники недоступны, каждый вызов заново пробует их опросить.
+
+    Returns:
+        CurrencySnapshot: Снимок курсов валют
+    """
+    try:
+        return await _currency_snapshot.get()
+    except Exception as e:
+        logger.error(f"Failed to get currency rates, using fallback USD/RUB rate: {str(e)}")
+        return _fallback_snapshot()
 
 
 async def get_usd_to_rub_rate() -> float:
     """
     Получает текущий курс доллара к рублю.
-    Сначала проверяет кэш, если данных нет, делает запрос к API.
     
     Returns:
         float: Курс доллара к рублю
     """
-    cached_rate = await get_cache(CURRENCY_CACHE_KEY)
-    if cached_rate is not None:
-        return float(cached_rate)
+    snapshot = await get_currency_snapshot()
+    return snapshot.rates.get("USD", settings.CURRENCY_FALLBACK_RATE)
+
+
+def _fallback_snapshot() -> CurrencySnapshot:
+    # В случае ошибки используем дефолтное значение курса доллара
+    return CurrencySnapshot(date=None, rates={"RUB": 1.0, "USD": settings.CURRENCY_FALLBACK_RATE})
+
+
+def _parse_snapshot(data: dict) -> CurrencySnapshot:
+    """
+    Разбирает ответ ЦБ в снимок курсов с учетом номинала валюты.
+
+    Args:
+        data: Ответ источника курсов
+
+    Returns:
+        CurrencySnapshot: Снимок курсов валют
+    """
+    rates = {
+        code: float(valute["Value"]) / float(valute.get("Nominal", 1))
+        for code, valute in data["Valute"].items()
+    }
+    rates["RUB"] = 1.0
+    return CurrencySnapshot(date=str(data.get("Date", ""))[:10] or None, rates=rates)
+
+
+async def _read_cached_snapshot() -> tuple[CurrencySnapshot | None, int]:
+    """
+    Читает снимок курсов из Redis вместе с оставшимся временем жизни ключа.
+
+    Returns:
+        tuple[CurrencySnapshot | None, int]: Снимок (или None) и TTL в секундах;
+            при ошибке Redis - промах кэша
+    """
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(CURRENCY_RATES_KEY)
+            pipe.ttl(CURRENCY_RATES_KEY)
+            fields, ttl = await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to read currency rates from cache: {str(e)}")
+        return None, -2
+
+    if not fields:
+        return None, ttl
+
+    date = fields.pop(CURRENCY_DATE_FIELD, None)
+    return CurrencySnapshot(date=date or None, rates={code: float(rate) for code, rate in fields.items()}), ttl
+
+
+async def _store_snapshot(snapshot: CurrencySnapshot) -> None:
+    """
+    Сохраняет снимок курсов в Redis.
+
+    Args:
+        snapshot: Снимок курсов валют
+    """
+    mapping = {**snapshot.rates, CURRENCY_DATE_FIELD: snapshot.date or ""}
+    await set_hash(CURRENCY_RATES_KEY, mapping, ttl=settings.CURRENCY_CACHE_TTL)
+
+
+async def _load_currency_snapshot() -> CurrencySnapshot:
+    """
+    Загружает снимок курсов: сначала из Redis, а если ключ
+    отсутствует, скоро истечет или Redis недоступен - из API, по очереди опрашивая
+    основной адрес и зеркала. Если все источники недоступны, возвращает закэшированный
+    снимок. Вызывается не более чем одной корутиной на процесс одновременно.
+
+    Returns:
+        CurrencySnapshot: Снимок курсов валют
+
+    Raises:
+        RuntimeError: Если все источники недоступны и в Redis нет курсов
+    """
+    cached_snapshot, ttl = await _read_cached_snapshot()
+    if cached_snapshot is not None and ttl > settings.CURRENCY_REFRESH_AHEAD:
+        return cached_snapshot
+
+    for url in [settings.CURRENCY_API_URL, *settings.CURRENCY_API_MIRROR_URLS]:
+        try:
+            snapshot = _parse_snapshot(await _fetch_rates(url))
+            break
+        except Exception as e:
+            logger.warning(f"Currency provider {url} failed: {str(e)}")
+    else:
+        if cached_snapshot is not None:
+            logger.warning("All currency providers failed, using cached currency rates")
+            return cached_snapshot
+        raise RuntimeError("All currency providers failed and no cached rates are available")
+
+    await _store_snapshot(snapshot)
+    if "USD" in snapshot.rates:
+        await _notify_rate_change(snapshot.rates["USD"])
+
+    return snapshot
+
+
+async def _fetch_rates(url: str) -> dict:
+    """
+    Запрашивает курсы валют у одного источника через общий HTTP-клиент
+    и записывает время ответа в метрики.
+
+    Args:
+        url: Адрес источника курсов
+
+    Returns:
+        dict: Ответ источника
+    """
+    provider = httpx.URL(url).host
+    started = time.perf_counter()
+    try:
+        response = await get_http_client().get(url)
+        response.raise_for_status()
+        return response.json()
+    except Exception:
+        currency_provider_errors.inc(provider=provider)
+        raise
+    finally:
+        currency_provider_latency.observe(time.perf_counter() - started, provider=provider)
+
+
+_currency_snapshot = StaleWhileRevalidate(
+    _load_currency_snapshot,
+    ttl=settings.CURRENCY_L1_TTL,
+    refresh_ahead=settings.CURRENCY_L1_REFRESH_AHEAD
+)
+
+
+async def _notify_rate_change(rate: float) -> None:
+    """
+    Запоминает последний полученный курс и, если он изменился,
+    запускает пересчет стоимости доставки всех посылок (при RECOMPUTE_ON_RATE_CHANGE).
+
+    Args:
+        rate: Только что полученный курс доллара к рублю
+    """
+    try:
+        previous_rate = await get_cache(CURRENCY_LAST_RATE_KEY)
+    except Exception as e:
+        logger.warning(f"Failed to read last USD/RUB rate: {str(e)}")
+        return
+    await set_cache(CURRENCY_LAST_RATE_KEY, rate)
+
+    if not settings.RECOMPUTE_ON_RATE_CHANGE or previous_rate is None or float(previous_rate) == rate:
+        return
 
+    logger.info(f"USD/RUB rate changed from {previous_rate} to {rate}, requesting shipping cost recompute")
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(settings.CURRENCY_API_URL)
-            response.raise_for_status()
-            data = response.json()
-            rate = data["Valute"]["USD"]["Value"]
-
-            await set_cache(
-                CURRENCY_CACHE_KEY,
-                rate,
-                ttl=settings.CURRENCY_CACHE_TTL
-            )
-
-            return float(rate)
+        await publisher.publish({"usd_to_rub_rate": rate}, routing_key="package.recompute")
     except Exception as e:
-        # В случае ошибки возвращаем дефолтное значение курса
-        # В реальном приложении здесь должно быть логирование ошибки
-        return 75.0  # Примерное значение
+        logger.error(f"Failed to request shipping cost recompute: {str(e)}")
@@ -0,0 +1,75 @@
+import asyncio
+
+from sqlalchemy import update, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.base import async_session
+from app.models.id_sequence import IdSequence
+from app.utils.logging import app_logger as logger
+
+
+class IdBlockAllocator:
+    """
+    Выдает идентификаторы из блоков, заранее зарезервированных в таблице id_sequences.
+
+    Блок резервируется одним запросом
+    UPDATE ... SET next_value = LAST_INSERT_ID(next_value + n), поэтому процессы
+    не пересекаются и не держат блокировку строки дольше одного запроса.
+    Неиспользованный остаток блока теряется при перезапуске процесса -
+    в последовательности ID допустимы пропуски.
+    """
+
+    def __init__(
+            self,
+            session_maker: async_sessionmaker[AsyncSession],
+            name: str,
+            block_size: int,
+    ):
+        self.session_maker = session_maker
+        self.name = name
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def _reserve(self, size: int) -> tuple[int, int]:
+        async with self.session_maker() as session:
+            result = await session.execute(
+                update(IdSequence)
+                .where(IdSequence.name == self.name)
+                .values(next_value=func.last_insert_id(IdSequence.next_value + size))
+            )
+            if result.rowcount == 0:
+                raise RuntimeError(f"ID sequence {self.name} not found")
+
+            end = await session.scalar(select(func.last_insert_id()))
+            await session.commit()
+
+        logger.debug(f"Reserved IDs [{end - size}, {end}) of sequence {self.name}")
+        return end - size, end
+
+    async def allocate(self, count: int = 1) -> list[int]:
+        """
+        Выдает count новых идентификаторов.
+
+        Args:
+            count: Количество идентификаторов
+
+        Returns:
+            list[int]: Идентификаторы в порядке возрастания
+        """
+        async with self._lock:
+            ids = []
+            while len(ids) < count:
+                if self._next >= self._end:
+                    self._next, self._end = await self._reserve(max(self.block_size, count - len(ids)))
+
+                take = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+
+            return ids
+
+
+package_id_allocator = IdBlockAllocator(async_session, "packages", settings.PACKAGE_ID_BLOCK_SIZE)
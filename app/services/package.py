@@ -1,69 +1,194 @@
-from typing import Any, Sequence
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Sequence
 
-from sqlalchemy import select, func, update, and_
+from sqlalchemy import select, insert, update, func, case, Select, Row
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
+from app.core.config import settings
 from app.models.package import Package
+from app.models.package_type import PackageType
 from app.models.user_session import UserSession
 from app.schemas.package import PackageCreate, PackageFilter
-from app.services.shipping_cost import calculate_shipping_cost
+from app.services.currency import get_usd_to_rub_rate
+from app.services.package_counter import (
+    apply_counter_deltas,
+    created_packages_deltas,
+    calculated_packages_deltas,
+    get_packages_total,
+)
+from app.services.package_events import publish_package_events, PACKAGE_COST_CALCULATED
+from app.services.shipping_cost import compute_shipping_cost, get_shipping_cost_display
+from app.utils.logging import app_logger as logger
+from app.utils.redis import get_cache, set_cache, redis_client
 
+PACKAGE_DETAIL_CACHE_KEY = "package:detail:{package_id}"
 
-async def create_package(
+# Колонки списка посылок: только поля, которые попадают в ответ API
+PACKAGE_LIST_COLUMNS = (
+    Package.id,
+    Package.name,
+    Package.weight,
+    Package.price_usd,
+    Package.package_type_id,
+    Package.shipping_cost,
+    Package.is_shipping_cost_calculated,
+    PackageType.name.label("package_type_name"),
+)
+
+# Колонки выгрузки посылок
+PACKAGE_EXPORT_COLUMNS = (
+    Package.id,
+    Package.name,
+    Package.weight,
+    Package.price_usd,
+    Package.package_type_id,
+    PackageType.name.label("package_type_name"),
+    Package.shipping_cost,
+    Package.is_shipping_cost_calculated,
+    Package.shipping_company_id,
+    Package.created_at,
+    Package.updated_at,
+)
+
+
+async def create_packages(
         db: AsyncSession,
-        obj_in: PackageCreate,
-        user_session: UserSession
-) -> Package:
+        objs_in: Sequence[tuple[int, PackageCreate, int]]
+) -> list[tuple[int, PackageCreate, int]]:
     """
-    Создает новую посылку в базе данных.
-    
+    Идемпотентно создает пачку посылок с заранее выданными ID
+    одним многострочным INSERT в одной транзакции вместе с обновлением счетчиков.
+    Посылки, ID которых уже есть в базе (повторно доставленные сообщения),
+    пропускаются.
+
     Args:
         db: Сессия базы данных
-        obj_in: Данные для создания посылки
-        user_session: Объект сессии пользователя
-        
+        objs_in: Тройки (ID посылки, данные для создания посылки, ID сессии пользователя)
+
     Returns:
-        Package: Созданная посылка
-    """
-    db_obj = Package(
-        name=obj_in.name,
-        weight=obj_in.weight,
-        price_usd=obj_in.price_usd,
-        package_type_id=obj_in.package_type_id,
-        user_session_id=user_session.id,
+        list[tuple[int, PackageCreate, int]]: Тройки действительно созданных посылок
+    """
+    # Повторы внутри пачки схлопываются, уже существующие ID отбрасываются
+    items = {package_id: (package_id, obj_in, user_session_id) for package_id, obj_in, user_session_id in objs_in}
+    if not items:
+        return []
+
+    result = await db.execute(select(Package.id).where(Package.id.in_(list(items))))
+    for package_id in result.scalars().all():
+        del items[package_id]
+
+    created = list(items.values())
+    if not created:
+        return []
+
+    await db.execute(
+        insert(Package),
+        [
+            dict(
+                id=package_id,
+                name=obj_in.name,
+                weight=obj_in.weight,
+                price_usd=obj_in.price_usd,
+                package_type_id=obj_in.package_type_id,
+                user_session_id=user_session_id,
+            )
+            for package_id, obj_in, user_session_id in created
+        ]
+    )
+    await apply_counter_deltas(
+        db,
+        created_packages_deltas((user_session_id, obj_in.package_type_id) for _, obj_in, user_session_id in created)
     )
-    db.add(db_obj)
     await db.commit()
-    await db.refresh(db_obj)
-    return db_obj
+    return created
 
 
-async def get_package(
+async def get_package_detail(
         db: AsyncSession,
         package_id: int,
         user_session: UserSession
-) -> Package | None:
+) -> dict[str, Any] | None:
     """
-    Получает посылку по ID для текущей сессии пользователя.
-    
+    Получает сериализованную карточку посылки через кэш Redis (read-through).
+    Запись кэша удаляется при записи стоимости доставки и привязке компании,
+    а пока стоимость не рассчитана, живет не дольше PACKAGE_DETAIL_PENDING_CACHE_TTL.
+
     Args:
         db: Сессия базы данных
         package_id: ID посылки
         user_session: Объект сессии пользователя
-        
+
     Returns:
-        Package | None: Найденная посылка или None
+        dict[str, Any] | None: Данные посылки или None, если посылка не найдена
     """
-    result = await db.execute(
-        select(Package)
-        .options(selectinload(Package.package_type))
-        .where(
-            Package.id == package_id,
-            Package.user_session_id == user_session.id
-        )
+    cache_key = PACKAGE_DETAIL_CACHE_KEY.format(package_id=package_id)
+
+    try:
+        cached = await get_cache(cache_key)
+    except Exception as e:
+        logger.warning(f"Failed to read package {package_id} from cache: {str(e)}")
+        cached = None
+
+    if cached is not None:
+        # Кэш общий для всех сессий, владелец проверяется при каждом чтении
+        if cached["user_session_id"] != user_session.id:
+            return None
+        return cached["data"]
+
+    result = await db.execute(_package_detail_query(package_id))
+    row = result.first()
+    if row is None:
+        return None
+
+    owner_id = row.user_session_id
+    data = serialize_package_row(row)
+
+    await set_cache(
+        cache_key,
+        {"user_session_id": owner_id, "data": data},
+        ttl=settings.PACKAGE_DETAIL_CACHE_TTL if row.is_shipping_cost_calculated
+        else settings.PACKAGE_DETAIL_PENDING_CACHE_TTL
     )
-    return result.scalars().first()
+
+    if owner_id != user_session.id:
+        return None
+    return data
+
+
+async def invalidate_package_details(package_ids: Sequence[int]) -> None:
+    """
+    Удаляет карточки посылок из кэша. Ошибки Redis не прерывают запись в базу:
+    устаревшая карточка в худшем случае доживет до истечения TTL.
+
+    Args:
+        package_ids: ID посылок
+    """
+    if not package_ids:
+        return
+
+    try:
+        await redis_client.delete(*(PACKAGE_DETAIL_CACHE_KEY.format(package_id=x) for x in package_ids))
+    except Exception as e:
+        logger.warning(f"Failed to invalidate {len(package_ids)} package details: {str(e)}")
+
+
+def serialize_package_row(row: Row) -> dict[str, Any]:
+    """
+    Формирует данные посылки из строки с колонками PACKAGE_LIST_COLUMNS
+    в том же виде, что и схема Package, но без валидации pydantic.
+    """
+    return {
+        "name": row.name,
+        "weight": row.weight,
+        "price_usd": row.price_usd,
+        "package_type_id": row.package_type_id,
+        "shipping_cost": row.shipping_cost,
+        "is_shipping_cost_calculated": row.is_shipping_cost_calculated,
+        "package_type_name": row.package_type_name,
+        "shipping_cost_display": get_shipping_cost_display(row.shipping_cost),
+    }
 
 
 async def get_packages(
@@ -72,9 +197,11 @@ async def get_packages(
         skip: int = 0,
         limit: int = 100,
         filters: PackageFilter | None = None,
-) -> tuple[Sequence[Package], Any | None]:
+) -> tuple[Sequence[Row], int]:
     """
     Получает список посылок с пагинацией и фильтрацией.
+    Общее количество берется из счетчиков посылок, а не считается по таблице.
+    Посылки возвращаются строками из колонок PACKAGE_LIST_COLUMNS без создания ORM-объектов.
     
     Args:
         db: Сессия базы данных
@@ -84,12 +211,102 @@ async def get_packages(
         filters: Фильтры для выборки
         
     Returns:
-        tuple[Sequence[Package], int]: Список посылок и общее количество записей
+        tuple[Sequence[Row], int]: Список посылок и общее количество записей
+    """
+    query = _filtered_packages_query(user_session, filters)
+
+    total = await get_packages_total(db, user_session.id, filters)
+
+    result = await db.execute(
+        query.order_by(Package.id).offset(skip).limit(limit)
+    )
+
+    return result.all(), total
+
+
+async def get_packages_after(
+        db: AsyncSession,
+        user_session: UserSession,
+        after_id: int | None = None,
+        limit: int = 100,
+        filters: PackageFilter | None = None,
+        with_total: bool = False,
+) -> tuple[Sequence[Row], int | None, int | None]:
+    """
+    Получает страницу посылок по курсору (keyset-пагинация по ID).
+    Вместо OFFSET используется условие id > after_id, поэтому стоимость
+    запроса не зависит от глубины страницы.
+    Посылки возвращаются строками из колонок PACKAGE_LIST_COLUMNS без создания ORM-объектов.
+
+    Args:
+        db: Сессия базы данных
+        user_session: Объект сессии пользователя
+        after_id: ID последней посылки предыдущей страницы (None - первая страница)
+        limit: Сколько записей вернуть
+        filters: Фильтры для выборки
+        with_total: Посчитать общее количество записей
+
+    Returns:
+        tuple[Sequence[Row], int | None, int | None]: Список посылок,
+            ID для курсора следующей страницы (None, если страница последняя)
+            и общее количество записей (None, если не запрашивалось)
+    """
+    query = _filtered_packages_query(user_session, filters)
+
+    total = None
+    if with_total:
+        total = await get_packages_total(db, user_session.id, filters)
+
+    if after_id is not None:
+        query = query.where(Package.id > after_id)
+
+    result = await db.execute(
+        query.order_by(Package.id).limit(limit + 1)
+    )
+    packages = result.all()
+
+    next_after_id = None
+    if len(packages) > limit:
+        packages = packages[:limit]
+        next_after_id = packages[-1].id
+
+    return packages, next_after_id, total
+
+
+async def stream_packages(
+        db: AsyncSession,
+        user_session: UserSession,
+        filters: PackageFilter | None = None,
+        partition_size: int = 1000,
+) -> AsyncIterator[Sequence[Row]]:
+    """
+    Читает все посылки сессии пользователя через серверный курсор
+    и отдает их порциями, не загружая выборку в память целиком.
+
+    Args:
+        db: Сессия базы данных
+        user_session: Объект сессии пользователя
+        filters: Фильтры для выборки
+        partition_size: Размер порции
+
+    Yields:
+        Sequence[Row]: Порция строк из колонок PACKAGE_EXPORT_COLUMNS
     """
+    query = _filtered_packages_query(user_session, filters, PACKAGE_EXPORT_COLUMNS).order_by(Package.id)
+
+    result = await db.stream(query.execution_options(yield_per=partition_size))
+    async for partition in result.partitions():
+        yield partition
+
+
+def _filtered_packages_query(
+        user_session: UserSession,
+        filters: PackageFilter | None,
+        columns: Sequence[Any] = PACKAGE_LIST_COLUMNS,
+) -> Select:
     query = (
-        select(
-            Package,
-        )
+        select(*columns)
+        .join(PackageType, PackageType.id == Package.package_type_id)
         .where(Package.user_session_id == user_session.id)
     )
 
@@ -99,101 +316,237 @@ async def get_packages(
         if filters.has_shipping_cost is not None:
             query = query.where(Package.is_shipping_cost_calculated == filters.has_shipping_cost)
 
-    count_query = select(func.count()).select_from(query.subquery())
-    total = await db.scalar(count_query)
+    return query
 
-    result = await db.execute(
-        query.offset(skip).limit(limit)
+
+def _package_detail_query(package_id: int) -> Select:
+    return (
+        select(*PACKAGE_LIST_COLUMNS, Package.user_session_id)
+        .join(PackageType, PackageType.id == Package.package_type_id)
+        .where(Package.id == package_id)
+    )
+
+
+def _claimable_packages_query(limit: int) -> Select:
+    return (
+        select(Package.id)
+        .where(
+            Package.shipping_company_id.is_(None),
+            # Равенство (= 1), а не IS TRUE: только так MySQL использует индекс
+            # (shipping_company_id, is_shipping_cost_calculated, id) и отдает строки в порядке ID,
+            # не блокируя в FOR UPDATE все просмотренные строки
+            Package.is_shipping_cost_calculated == True  # noqa: E712
+        )
+        .order_by(Package.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
     )
 
-    return result.scalars().all(), total
+
+def encode_cursor(after_id: int) -> str:
+    """
+    Кодирует позицию в непрозрачный курсор.
+    """
+    return base64.urlsafe_b64encode(json.dumps({"id": after_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Декодирует курсор, полученный от encode_cursor.
+
+    Raises:
+        ValueError: Если курсор некорректен
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return int(data["id"])
+    except Exception as e:
+        raise ValueError("Некорректный курсор") from e
+
+
+async def update_shipping_costs(
+        db: AsyncSession,
+        shipping_costs: dict[int, float]
+) -> int:
+    """
+    Обновляет стоимость доставки для пачки посылок запросами UPDATE ... CASE
+    по SHIPPING_COST_CHUNK_SIZE посылок, каждая порция - отдельной транзакцией.
+    MySQL перебирает ветви CASE последовательно для каждой строки, поэтому
+    размер одного запроса ограничен.
+    Счетчики посылок обновляются в той же транзакции, что и порция.
+
+    Args:
+        db: Сессия базы данных
+        shipping_costs: Рассчитанная стоимость доставки по ID посылки
+
+    Returns:
+        int: Количество обновленных посылок
+    """
+    updated = 0
+    package_ids = list(shipping_costs)
+
+    for start in range(0, len(package_ids), settings.SHIPPING_COST_CHUNK_SIZE):
+        chunk = {package_id: shipping_costs[package_id]
+                 for package_id in package_ids[start:start + settings.SHIPPING_COST_CHUNK_SIZE]}
+
+        await apply_counter_deltas(db, await calculated_packages_deltas(db, list(chunk)))
+
+        result = await db.execute(
+            update(Package)
+            .where(Package.id.in_(list(chunk)))
+            .values(
+                shipping_cost=case(chunk, value=Package.id),
+                is_shipping_cost_calculated=True
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        await invalidate_package_details(list(chunk))
+        updated += result.rowcount
+
+    return updated
 
 
-async def update_shipping_cost(
+async def assign_shipping_company(
         db: AsyncSession,
         package_id: int,
-        shipping_cost: float
-) -> bool:
+        shipping_company_id: int
+) -> int | None:
     """
-    Обновляет стоимость доставки для посылки.
-    
+    Привязывает посылку к транспортной компании одним атомарным запросом.
+
+    UPDATE оставляет уже привязанную компанию без изменений и через
+    LAST_INSERT_ID(expr) возвращает в ответе сервера ID компании, за которой
+    посылка закреплена после запроса, поэтому повторное чтение не нужно.
+    Время изменения обновляется только при фактической привязке.
+
     Args:
         db: Сессия базы данных
         package_id: ID посылки
-        shipping_cost: Рассчитанная стоимость доставки
+        shipping_company_id: ID транспортной компании
         
     Returns:
-        bool: True, если обновление успешно, иначе False
+        int | None: ID компании, за которой закреплена посылка, или None, если посылка не найдена
     """
     result = await db.execute(
         update(Package)
         .where(Package.id == package_id)
-        .values(
-            shipping_cost=shipping_cost,
-            is_shipping_cost_calculated=True
+        # MySQL вычисляет присваивания слева направо, updated_at должен проверяться до привязки
+        .ordered_values(
+            (
+                Package.updated_at,
+                case((Package.shipping_company_id.is_(None), datetime.now()), else_=Package.updated_at)
+            ),
+            (
+                Package.shipping_company_id,
+                func.last_insert_id(func.coalesce(Package.shipping_company_id, shipping_company_id))
+            ),
         )
+        .execution_options(synchronize_session=False)
     )
     await db.commit()
-    return result.rowcount > 0
 
+    # SQLAlchemy открывает соединения MySQL с флагом FOUND_ROWS: rowcount - количество найденных строк
+    if result.rowcount == 0:
+        return None
 
-async def assign_shipping_company(
+    owner_id = result.lastrowid
+    if owner_id == shipping_company_id:
+        await invalidate_package_details([package_id])
+    return owner_id
+
+
+async def claim_packages(
         db: AsyncSession,
-        package_id: int,
-        shipping_company_id: int
-) -> bool:
+        shipping_company_id: int,
+        limit: int
+) -> list[int]:
     """
-    Привязывает посылку к транспортной компании.
+    Закрепляет за транспортной компанией до limit свободных посылок
+    с рассчитанной стоимостью доставки.
+
+    Посылки выбираются с SELECT ... FOR UPDATE SKIP LOCKED, поэтому компании,
+    забирающие посылки одновременно, не ждут друг друга и получают разные посылки.
 
     Args:
         db: Сессия базы данных
-        package_id: ID посылки
         shipping_company_id: ID транспортной компании
-        
+        limit: Максимальное количество посылок
+
     Returns:
-        bool: True, если привязка успешна, иначе False
+        list[int]: ID закрепленных посылок
     """
-    result = await db.execute(
+    result = await db.execute(_claimable_packages_query(limit))
+    package_ids = list(result.scalars().all())
+
+    if not package_ids:
+        await db.commit()
+        return []
+
+    await db.execute(
         update(Package)
-        .where(
-            and_(
-                Package.id == package_id,
-                Package.shipping_company_id.is_(None)
-            )
-        )
+        .where(Package.id.in_(package_ids))
         .values(shipping_company_id=shipping_company_id)
+        .execution_options(synchronize_session=False)
     )
     await db.commit()
-    return result.rowcount > 0
+
+    await invalidate_package_details(package_ids)
+    return package_ids
 
 
-async def calculate_and_update_shipping_cost(
+async def calculate_and_update_shipping_costs(
         db: AsyncSession,
-        package_id: int
-) -> float | None:
+        package_ids: Sequence[int]
+) -> dict[int, float]:
     """
-    Рассчитывает и обновляет стоимость доставки для посылки.
-    
+    Рассчитывает и обновляет стоимость доставки для пачки посылок:
+    один запрос курса, затем по SHIPPING_COST_CHUNK_SIZE посылок
+    один SELECT весов и стоимостей и один UPDATE.
+    Владельцы посылок получают событие package.cost_calculated.
+
     Args:
         db: Сессия базы данных
-        package_id: ID посылки
-        
+        package_ids: ID посылок
+
     Returns:
-        float | None: Рассчитанная стоимость доставки или None в случае ошибки
+        dict[int, float]: Рассчитанная стоимость доставки по ID найденных посылок
     """
-    result = await db.execute(
-        select(Package).where(Package.id == package_id)
-    )
-    package = result.scalars().first()
+    package_ids = sorted(set(package_ids))
+    if not package_ids:
+        return {}
 
-    if not package:
-        return None
+    usd_to_rub_rate = await get_usd_to_rub_rate()
+    shipping_costs = {}
 
-    shipping_cost = await calculate_shipping_cost(
-        weight=package.weight,
-        price_usd=package.price_usd
-    )
+    for start in range(0, len(package_ids), settings.SHIPPING_COST_CHUNK_SIZE):
+        result = await db.execute(
+            select(Package.id, Package.weight, Package.price_usd, Package.user_session_id)
+            .where(Package.id.in_(package_ids[start:start + settings.SHIPPING_COST_CHUNK_SIZE]))
+        )
+        rows = result.all()
+        if not rows:
+            continue
 
-    await update_shipping_cost(db, package_id, shipping_cost)
+        chunk_costs = {
+            row.id: compute_shipping_cost(row.weight, row.price_usd, usd_to_rub_rate)
+            for row in rows
+        }
+
+        await update_shipping_costs(db, chunk_costs)
+        shipping_costs.update(chunk_costs)
+
+        await publish_package_events(
+            (
+                row.user_session_id,
+                {
+                    "event": PACKAGE_COST_CALCULATED,
+                    "package_id": row.id,
+                    "shipping_cost": chunk_costs[row.id],
+                    "shipping_cost_display": get_shipping_cost_display(chunk_costs[row.id]),
+                }
+            )
+            for row in rows
+        )
 
-    return shipping_cost
+    return shipping_costs
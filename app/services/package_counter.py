@@ -0,0 +1,199 @@
+from collections import Counter
+from typing import Iterable, Sequence
+
+from sqlalchemy import select, func, delete
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.package import Package
+from app.models.package_counter import PackageCounter
+from app.schemas.package import PackageFilter
+
+# (ID сессии пользователя, ID типа посылки, стоимость рассчитана)
+CounterKey = tuple[int, int, bool]
+
+
+async def apply_counter_deltas(db: AsyncSession, deltas: Counter[CounterKey]) -> None:
+    """
+    Применяет изменения счетчиков посылок одним INSERT ... ON DUPLICATE KEY UPDATE.
+    Выполняется в транзакции вызывающего кода и не делает commit, чтобы счетчики
+    менялись атомарно вместе с самими посылками.
+
+    Args:
+        db: Сессия базы данных
+        deltas: Изменение количества посылок по ключу счетчика
+    """
+    # Строки счетчиков блокируются в одном порядке во всех транзакциях
+    rows = [
+        dict(
+            user_session_id=user_session_id,
+            package_type_id=package_type_id,
+            is_shipping_cost_calculated=is_calculated,
+            packages_count=delta,
+        )
+        for (user_session_id, package_type_id, is_calculated), delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return
+
+    stmt = insert(PackageCounter).values(rows)
+    await db.execute(
+        stmt.on_duplicate_key_update(
+            packages_count=PackageCounter.packages_count + stmt.inserted.packages_count
+        )
+    )
+
+
+def created_packages_deltas(packages: Iterable[tuple[int, int]]) -> Counter[CounterKey]:
+    """
+    Изменения счетчиков для новых посылок (стоимость доставки еще не рассчитана).
+
+    Args:
+        packages: Пары (ID сессии пользователя, ID типа посылки) новых посылок
+    """
+    return Counter(
+        (user_session_id, package_type_id, False)
+        for user_session_id, package_type_id in packages
+    )
+
+
+async def calculated_packages_deltas(db: AsyncSession, package_ids: Sequence[int]) -> Counter[CounterKey]:
+    """
+    Изменения счетчиков для посылок, у которых впервые рассчитывается стоимость доставки.
+    Строки таких посылок блокируются до конца транзакции, чтобы параллельный
+    расчет той же посылки не учел ее повторно.
+
+    Args:
+        db: Сессия базы данных
+        package_ids: ID посылок, для которых записывается стоимость доставки
+
+    Returns:
+        Counter[CounterKey]: Изменения счетчиков
+    """
+    result = await db.execute(
+        select(Package.user_session_id, Package.package_type_id)
+        .where(
+            Package.id.in_(list(package_ids)),
+            Package.is_shipping_cost_calculated.is_(False)
+        )
+        .with_for_update()
+    )
+
+    deltas: Counter[CounterKey] = Counter()
+    for user_session_id, package_type_id in result.all():
+        deltas[(user_session_id, package_type_id, False)] -= 1
+        deltas[(user_session_id, package_type_id, True)] += 1
+    return deltas
+
+
+async def get_packages_total(
+        db: AsyncSession,
+        user_session_id: int,
+        filters: PackageFilter | None = None,
+) -> int:
+    """
+    Возвращает количество посылок сессии пользователя по счетчикам.
+    Читается не больше (количество типов посылок x 2) строк независимо от числа посылок.
+
+    Args:
+        db: Сессия базы данных
+        user_session_id: ID сессии пользователя
+        filters: Фильтры выборки
+
+    Returns:
+        int: Количество посылок
+    """
+    query = (
+        select(func.coalesce(func.sum(PackageCounter.packages_count), 0))
+        .where(PackageCounter.user_session_id == user_session_id)
+    )
+
+    if filters:
+        if filters.package_type_id is not None:
+            query = query.where(PackageCounter.package_type_id == filters.package_type_id)
+        if filters.has_shipping_cost is not None:
+            query = query.where(PackageCounter.is_shipping_cost_calculated == filters.has_shipping_cost)
+
+    return int(await db.scalar(query))
+
+
+async def reconcile_counters(db: AsyncSession, user_session_ids: Sequence[int]) -> int:
+    """
+    Пересчитывает счетчики указанных сессий пользователей по таблице посылок.
+
+    Строки счетчиков сначала блокируются (SELECT ... FOR UPDATE), поэтому
+    параллельные создания и расчеты посылок этих сессий ждут окончания сверки
+    и применяют свои изменения уже поверх пересчитанных значений.
+
+    Блокирующее чтение не создает снимок REPEATABLE READ, его создает следующий
+    за ним подсчет посылок, то есть уже после получения блокировок. Поэтому функцию
+    нужно вызывать в начале транзакции: если до нее в транзакции было обычное
+    чтение, подсчет пойдет по более старому снимку и не учтет посылки,
+    созданные после него.
+
+    Args:
+        db: Сессия базы данных
+        user_session_ids: ID сессий пользователей
+
+    Returns:
+        int: Количество исправленных счетчиков
+    """
+    if not user_session_ids:
+        return 0
+
+    result = await db.execute(
+        select(PackageCounter)
+        .where(PackageCounter.user_session_id.in_(list(user_session_ids)))
+        .with_for_update()
+    )
+    current = {
+        (row.user_session_id, row.package_type_id, row.is_shipping_cost_calculated): row.packages_count
+        for row in result.scalars().all()
+    }
+
+    result = await db.execute(
+        select(
+            Package.user_session_id,
+            Package.package_type_id,
+            Package.is_shipping_cost_calculated,
+            func.count()
+        )
+        .where(Package.user_session_id.in_(list(user_session_ids)))
+        .group_by(Package.user_session_id, Package.package_type_id, Package.is_shipping_cost_calculated)
+    )
+    actual = {
+        (user_session_id, package_type_id, bool(is_calculated)): count
+        for user_session_id, package_type_id, is_calculated, count in result.all()
+    }
+
+    stale = [key for key in current if key not in actual]
+    for user_session_id, package_type_id, is_calculated in stale:
+        await db.execute(
+            delete(PackageCounter)
+            .where(
+                PackageCounter.user_session_id == user_session_id,
+                PackageCounter.package_type_id == package_type_id,
+                PackageCounter.is_shipping_cost_calculated == is_calculated
+            )
+        )
+
+    rows = [
+        dict(
+            user_session_id=user_session_id,
+            package_type_id=package_type_id,
+            is_shipping_cost_calculated=is_calculated,
+            packages_count=count,
+        )
+        for (user_session_id, package_type_id, is_calculated), count in sorted(actual.items())
+        if current.get((user_session_id, package_type_id, is_calculated)) != count
+    ]
+    if rows:
+        stmt = insert(PackageCounter).values(rows)
+        await db.execute(
+            stmt.on_duplicate_key_update(packages_count=stmt.inserted.packages_count)
+        )
+
+    await db.commit()
+
+    return len(stale) + len(rows)
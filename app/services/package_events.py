@@ -0,0 +1,65 @@
+import json
+from typing import Any, AsyncIterator, Iterable
+
+from app.utils.logging import app_logger as logger
+from app.utils.redis import redis_client
+
+PACKAGE_EVENTS_CHANNEL = "packages:events:{user_session_id}"
+
+PACKAGE_CREATED = "package.created"
+PACKAGE_COST_CALCULATED = "package.cost_calculated"
+
+
+async def publish_package_events(events: Iterable[tuple[int, dict[str, Any]]]) -> None:
+    """
+    Публикует события о посылках в каналы Redis pub/sub сессий пользователей.
+    Все события отправляются одним конвейером. Ошибки публикации только
+    логируются: уведомления не должны прерывать обработку посылок.
+
+    Args:
+        events: Пары (ID сессии пользователя, событие с полем event)
+    """
+    events = list(events)
+    if not events:
+        return
+
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_session_id, event in events:
+                pipe.publish(PACKAGE_EVENTS_CHANNEL.format(user_session_id=user_session_id), json.dumps(event))
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to publish {len(events)} package events: {str(e)}")
+
+
+async def listen_package_events(
+        user_session_id: int,
+        heartbeat_interval: float,
+) -> AsyncIterator[dict[str, Any] | None]:
+    """
+    Подписывается на события о посылках сессии пользователя.
+
+    Args:
+        user_session_id: ID сессии пользователя
+        heartbeat_interval: Через сколько секунд без событий отдавать None
+
+    Yields:
+        dict[str, Any] | None: Событие или None, если событий не было heartbeat_interval секунд
+    """
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(PACKAGE_EVENTS_CHANNEL.format(user_session_id=user_session_id))
+
+    try:
+        while True:
+            message = await pubsub.get_message(timeout=heartbeat_interval)
+            if message is None:
+                yield None
+                continue
+
+            try:
+                yield json.loads(message["data"])
+            except json.JSONDecodeError:
+                logger.warning(f"Invalid package event for session {user_session_id}: {message['data']}")
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import time
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.base import async_read_session
+from app.models.package_type import PackageType
+from app.schemas.package_type import PackageType as PackageTypeSchema
+from app.utils.logging import app_logger as logger
+from app.utils.redis import get_cache, redis_client
+
+PACKAGE_TYPES_VERSION_KEY = "package_types:version"
+
+_package_types_adapter = TypeAdapter(list[PackageTypeSchema])
+
+
+def _make_etag(payload: bytes) -> str:
+    return f'"{hashlib.sha1(payload).hexdigest()}"'
+
+
+class PackageTypeCatalog:
+    """
+    Справочник типов посылок в памяти процесса.
+
+    Загружается из базы при старте и перечитывается только тогда, когда
+    меняется номер версии в Redis (см. bump_package_types_version). Номер версии
+    проверяется не чаще раза в check_interval секунд, поэтому в установившемся
+    режиме чтение справочника не обращается к MySQL.
+    """
+
+    def __init__(
+            self,
+            session_maker: async_sessionmaker[AsyncSession],
+            check_interval: float = settings.PACKAGE_TYPES_VERSION_CHECK_INTERVAL,
+    ):
+        self.session_maker = session_maker
+        self.check_interval = check_interval
+        self.version: str | None = None
+        self.etag: str | None = None
+        self._items: list[PackageTypeSchema] = []
+        self._by_id: dict[int, PackageTypeSchema] = {}
+        self._etags: dict[int, str] = {}
+        self._loaded = False
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def load(self, version: str | None = None) -> None:
+        """
+        Загружает справочник из базы данных.
+
+        Args:
+            version: Номер версии справочника, соответствующий загруженным данным
+        """
+        async with self.session_maker() as session:
+            result = await session.execute(select(PackageType).order_by(PackageType.id))
+            items = [PackageTypeSchema.model_validate(pt) for pt in result.scalars().all()]
+
+        self._items = items
+        self._by_id = {item.id: item for item in items}
+        self._etags = {item.id: _make_etag(item.model_dump_json().encode()) for item in items}
+        self.etag = _make_etag(_package_types_adapter.dump_json(items))
+        self.version = version
+        self._loaded = True
+        self._checked_at = time.monotonic()
+
+        logger.info(f"Loaded {len(items)} package types (version {version})")
+
+    async def _ensure_fresh(self) -> None:
+        if self._loaded and time.monotonic() - self._checked_at < self.check_interval:
+            return
+
+        async with self._lock:
+            if self._loaded and time.monotonic() - self._checked_at < self.check_interval:
+                return
+
+            try:
+                version = await get_cache(PACKAGE_TYPES_VERSION_KEY)
+                version = None if version is None else str(version)
+            except Exception as e:
+                if not self._loaded:
+                    raise
+                logger.warning(f"Failed to check package types version, serving loaded catalog: {str(e)}")
+                self._checked_at = time.monotonic()
+                return
+
+            if not self._loaded or version != self.version:
+                await self.load(version)
+            else:
+                self._checked_at = time.monotonic()
+
+    async def get_all(self) -> list[PackageTypeSchema]:
+        """
+        Возвращает все типы посылок.
+        """
+        await self._ensure_fresh()
+        return self._items
+
+    async def get(self, package_type_id: int) -> PackageTypeSchema | None:
+        """
+        Возвращает тип посылки по ID или None, если такого типа нет.
+        """
+        await self._ensure_fresh()
+        return self._by_id.get(package_type_id)
+
+    async def get_etag(self, package_type_id: int) -> str | None:
+        """
+        Возвращает ETag типа посылки по ID или None, если такого типа нет.
+        """
+        await self._ensure_fresh()
+        return self._etags.get(package_type_id)
+
+    async def ids(self) -> set[int]:
+        """
+        Возвращает множество ID всех типов посылок.
+        """
+        await self._ensure_fresh()
+        return set(self._by_id)
+
+    async def exists(self, package_type_id: int) -> bool:
+        """
+        Проверяет, существует ли тип посылки.
+        """
+        await self._ensure_fresh()
+        return package_type_id in self._by_id
+
+
+async def bump_package_types_version() -> None:
+    """
+    Увеличивает номер версии справочника типов посылок.
+    Вызывается после любого изменения таблицы package_types, чтобы
+    все процессы перечитали справочник.
+    """
+    await redis_client.incr(PACKAGE_TYPES_VERSION_KEY)
+
+
+package_type_catalog = PackageTypeCatalog(async_read_session)
@@ -1,20 +1,17 @@
-from app.services.currency import get_usd_to_rub_rate
-
-
-async def calculate_shipping_cost(weight: float, price_usd: float) -> float:
+def compute_shipping_cost(weight: float, price_usd: float, usd_to_rub_rate: float) -> float:
     """
     Рассчитывает стоимость доставки по формуле:
     Стоимость = (вес в кг * 0.5 + стоимость содержимого в долларах * 0.01) * курс доллара к рублю
-    
+    Курс передается вызывающим кодом, чтобы он запрашивался один раз на пачку посылок.
+
     Args:
         weight: Вес посылки в кг
         price_usd: Стоимость содержимого в долларах
-        
+        usd_to_rub_rate: Курс доллара к рублю
+
     Returns:
         float: Рассчитанная стоимость доставки в рублях
     """
-    usd_to_rub_rate = await get_usd_to_rub_rate()
-
     shipping_cost = (weight * 0.5 + price_usd * 0.01) * usd_to_rub_rate
 
     return round(shipping_cost, 2)
@@ -0,0 +1,191 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.base import async_session
+from app.models.user_session import UserSession
+from app.utils.cache import MISSING, TTLCache
+from app.utils.logging import app_logger as logger
+from app.utils.redis import get_cache, set_cache
+
+SESSION_CACHE_KEY = "session:id:{session_id}"
+
+
+class SessionActivityTracker:
+    """
+    Отложенная запись времени последней активности сессий пользователей.
+
+    Вместо UPDATE на каждый запрос активные сессии копятся в памяти, и раз
+    в flush_interval секунд им записывается время сброса, не больше chunk_size
+    сессий в одном запросе. Активность сессии учитывается не чаще,
+    чем раз в granularity секунд.
+    """
+
+    def __init__(
+            self,
+            session_maker: async_sessionmaker[AsyncSession],
+            flush_interval: float = settings.SESSION_ACTIVITY_FLUSH_INTERVAL,
+            granularity: float = settings.SESSION_ACTIVITY_GRANULARITY,
+            chunk_size: int = settings.SESSION_ACTIVITY_FLUSH_CHUNK_SIZE,
+    ):
+        self.session_maker = session_maker
+        self.flush_interval = flush_interval
+        self.granularity = timedelta(seconds=granularity)
+        self.chunk_size = chunk_size
+        self._pending: set[int] = set()
+        self._touched: dict[int, datetime] = {}
+        self._task: asyncio.Task | None = None
+
+    def touch(self, user_session_id: int, last_activity: datetime | None = None) -> None:
+        """
+        Отмечает активность сессии. Запись в базу произойдет при следующем сбросе.
+
+        Args:
+            user_session_id: ID сессии пользователя
+            last_activity: Известное время последней активности (UTC)
+        """
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        known = self._touched.get(user_session_id) or last_activity
+        if known is not None and now - known < self.granularity:
+            return
+
+        self._pending.add(user_session_id)
+        self._touched[user_session_id] = now
+
+    async def flush(self) -> int:
+        """
+        Записывает время сброса как время активности накопленных сессий,
+        по chunk_size сессий в одном UPDATE. При ошибке незаписанные сессии
+        остаются до следующего сброса.
+
+        Returns:
+            int: Количество обновленных сессий
+        """
+        pending, self._pending = list(self._pending), set()
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        threshold = now - self.granularity
+        self._touched = {key: value for key, value in self._touched.items() if value > threshold}
+
+        if not pending:
+            return 0
+
+        flushed = 0
+        async with self.session_maker() as session:
+            for start in range(0, len(pending), self.chunk_size):
+                chunk = pending[start:start + self.chunk_size]
+                try:
+                    await session.execute(
+                        update(UserSession)
+                        .where(UserSession.id.in_(chunk))
+                        .values(last_activity=now)
+                        .execution_options(synchronize_session=False)
+                    )
+                    await session.commit()
+                except Exception as e:
+                    logger.error(f"Failed to flush activity of {len(pending) - start} sessions: {str(e)}")
+                    self._pending.update(pending[start:])
+                    break
+                flushed += len(chunk)
+
+        return flushed
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        """
+        Запускает периодический сброс в фоне.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Останавливает периодический сброс и записывает оставшиеся данные.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+activity_tracker = SessionActivityTracker(async_session)
+
+
+# Соответствие cookie сессии -> ID сессии пользователя; None - сессия не найдена
+_session_cache: TTLCache[int | None] = TTLCache(
+    maxsize=settings.SESSION_CACHE_MAX_SIZE,
+    ttl=settings.SESSION_CACHE_TTL
+)
+
+
+async def resolve_session_id(db: AsyncSession, session_id: str) -> int | None:
+    """
+    Находит ID сессии пользователя по значению cookie.
+    Сначала проверяет кэш в памяти процесса, затем Redis и только потом базу данных.
+    Неизвестные значения cookie тоже кэшируются на SESSION_NEGATIVE_CACHE_TTL.
+
+    Args:
+        db: Сессия базы данных
+        session_id: ID сессии из cookie
+
+    Returns:
+        int | None: ID сессии пользователя или None, если сессия не найдена
+    """
+    user_session_id = _session_cache.get(session_id)
+    if user_session_id is not MISSING:
+        return user_session_id
+
+    cache_key = SESSION_CACHE_KEY.format(session_id=session_id)
+    try:
+        cached = await get_cache(cache_key)
+    except Exception as e:
+        logger.warning(f"Failed to read session from cache: {str(e)}")
+        cached = None
+
+    if cached is not None:
+        user_session_id = int(cached) or None
+    else:
+        result = await db.execute(
+            select(UserSession.id).where(UserSession.session_id == session_id)
+        )
+        user_session_id = result.scalar()
+        await set_cache(
+            cache_key,
+            user_session_id or 0,
+            ttl=settings.SESSION_REDIS_CACHE_TTL if user_session_id else settings.SESSION_NEGATIVE_CACHE_TTL
+        )
+
+    _session_cache.set(
+        session_id,
+        user_session_id,
+        ttl=None if user_session_id else settings.SESSION_NEGATIVE_CACHE_TTL
+    )
+    return user_session_id
+
+
+async def remember_session(session_id: str, user_session_id: int) -> None:
+    """
+    Кэширует только что созданную сессию, перекрывая возможную отрицательную запись.
+
+    Args:
+        session_id: ID сессии из cookie
+        user_session_id: ID сессии пользователя
+    """
+    _session_cache.set(session_id, user_session_id)
+    await set_cache(
+        SESSION_CACHE_KEY.format(session_id=session_id),
+        user_session_id,
+        ttl=settings.SESSION_REDIS_CACHE_TTL
+    )
+
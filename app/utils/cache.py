@@ -0,0 +1,100 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+from app.utils.logging import app_logger as logger
+
+T = TypeVar("T")
+
+MISSING: Any = object()
+
+
+class StaleWhileRevalidate(Generic[T]):
+    """
+    Значение в памяти процесса с фоновым обновлением.
+
+    - пока значение свежее, оно отдается без обращения к загрузчику;
+    - за refresh_ahead секунд до истечения ttl (и после него) запускается
+      фоновое обновление, а вызывающим отдается последнее известное значение;
+    - одновременно выполняется не больше одной загрузки, первые вызовы
+      без значения ожидают ее результата;
+    - если фоновое обновление упало, продолжает отдаваться последнее значение.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[T]], ttl: float, refresh_ahead: float = 0.0):
+        self.loader = loader
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self._value: T | None = None
+        self._loaded_at: float | None = None
+        self._task: asyncio.Task | None = None
+
+    async def get(self) -> T:
+        """
+        Возвращает значение, при необходимости загружая или обновляя его.
+
+        Returns:
+            T: Текущее значение
+        """
+        if self._loaded_at is None:
+            return await asyncio.shield(self._refresh())
+
+        if time.monotonic() - self._loaded_at >= self.ttl - self.refresh_ahead:
+            self._refresh()
+        return self._value
+
+    def _refresh(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._load())
+            self._task.add_done_callback(self._log_failure)
+        return self._task
+
+    async def _load(self) -> T:
+        value = await self.loader()
+        self._value = value
+        self._loaded_at = time.monotonic()
+        return value
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to load cached value: {str(task.exception())}")
+
+
+class TTLCache(Generic[T]):
+    """
+    Ограниченный по размеру LRU-кэш в памяти процесса с временем жизни записей.
+    Значение None допустимо и может использоваться для отрицательного кэширования;
+    отсутствие записи обозначается MISSING.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, T]] = OrderedDict()
+
+    def get(self, key: Hashable) -> T:
+        """
+        Возвращает значение по ключу или MISSING, если записи нет или она истекла.
+        """
+        item = self._data.get(key)
+        if item is None:
+            return MISSING
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return MISSING
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: T, ttl: float | None = None) -> None:
+        """
+        Сохраняет значение, вытесняя самую давно использованную запись при переполнении.
+        """
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
@@ -0,0 +1,38 @@
+import httpx
+
+from app.core.config import settings
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Возвращает общий для процесса HTTP-клиент с пулом keep-alive соединений
+    и таймаутами на подключение и чтение. Клиент создается при первом обращении.
+
+    Returns:
+        httpx.AsyncClient: HTTP-клиент
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.HTTP_READ_TIMEOUT,
+                connect=settings.HTTP_CONNECT_TIMEOUT
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS
+            ),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """
+    Закрывает общий HTTP-клиент и его соединения.
+    """
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
@@ -0,0 +1,201 @@
+import asyncio
+import bisect
+from functools import partial
+from typing import Callable, Iterable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Ограничения запроса к серверу метрик воркера
+METRICS_MAX_LINE_BYTES = 8192
+METRICS_MAX_HEADERS = 100
+
+
+class Metric:
+    """
+    Базовый класс метрики в памяти процесса.
+    Значения хранятся по кортежу значений меток в порядке labelnames.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.append(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key: tuple[str, ...], extra: dict[str, str] | None = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._functions: dict[tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float], **labels: str) -> None:
+        """
+        Значение метрики вычисляется функцией в момент выдачи метрик.
+        """
+        self._functions[self._key(labels)] = function
+
+    def samples(self) -> list[str]:
+        values = dict(self._values)
+        for key, function in self._functions.items():
+            values[key] = function()
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Iterable[str] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': str(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+registry: list[Metric] = []
+
+
+def render_metrics() -> str:
+    """
+    Формирует текущие значения всех метрик процесса
+    в текстовом формате Prometheus.
+
+    Returns:
+        str: Метрики в формате text/plain; version=0.0.4
+    """
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+async def _read_request_line(reader: asyncio.StreamReader) -> bytes | None:
+    """
+    Читает строку запроса и пропускает заголовки.
+
+    Returns:
+        bytes | None: Строка запроса или None, если заголовков больше METRICS_MAX_HEADERS
+    """
+    request_line = await reader.readline()
+    # Заголовки запроса не нужны, но их нужно дочитать до пустой строки
+    for _ in range(METRICS_MAX_HEADERS + 1):
+        if not (await reader.readline()).strip():
+            return request_line
+    return None
+
+
+async def _handle_metrics_request(
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        read_timeout: float,
+) -> None:
+    try:
+        try:
+            request_line = await asyncio.wait_for(_read_request_line(reader), read_timeout)
+        except asyncio.TimeoutError:
+            return
+        except ValueError:
+            # Строка длиннее лимита StreamReader
+            request_line = None
+
+        parts = (request_line or b"").split()
+        if request_line is None:
+            status, body = "431 Request Header Fields Too Large", b"Request Header Fields Too Large\n"
+        elif len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+            status, body = "200 OK", render_metrics().encode()
+        else:
+            status, body = "404 Not Found", b"Not Found\n"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int, read_timeout: float) -> asyncio.AbstractServer:
+    """
+    Запускает HTTP-сервер, отдающий GET /metrics, для процессов без FastAPI (воркер).
+    Соединение закрывается, если запрос не прочитан за read_timeout секунд;
+    строки длиннее METRICS_MAX_LINE_BYTES и больше METRICS_MAX_HEADERS заголовков
+    не принимаются.
+
+    Args:
+        host: Адрес для прослушивания
+        port: Порт для прослушивания
+        read_timeout: Время на чтение запроса в секундах
+
+    Returns:
+        asyncio.AbstractServer: Запущенный сервер, закрывается вызывающим кодом
+    """
+    return await asyncio.start_server(
+        partial(_handle_metrics_request, read_timeout=read_timeout),
+        host,
+        port,
+        limit=METRICS_MAX_LINE_BYTES,
+    )
@@ -0,0 +1,175 @@
+import codecs
+import json
+import re
+from typing import Any, AsyncIterable, AsyncIterator
+
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+
+class ItemTooLarge(ValueError):
+    """
+    Строка NDJSON или элемент JSON-массива длиннее допустимого.
+    """
+
+    def __init__(self, line_no: int, max_bytes: int):
+        super().__init__(f"Элемент {line_no} длиннее {max_bytes} байт")
+        self.line_no = line_no
+        self.max_bytes = max_bytes
+
+
+class BodyTooLarge(ValueError):
+    """
+    Тело запроса больше допустимого.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Тело запроса больше {max_bytes} байт")
+        self.max_bytes = max_bytes
+
+
+async def limit_body(chunks: AsyncIterable[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """
+    Пропускает фрагменты тела запроса, пока их суммарный размер не превышает max_bytes.
+
+    Raises:
+        BodyTooLarge: Если тело запроса больше max_bytes
+    """
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            raise BodyTooLarge(max_bytes)
+        yield chunk
+
+
+async def iter_ndjson_lines(
+        chunks: AsyncIterable[bytes],
+        max_line_bytes: int,
+) -> AsyncIterator[tuple[int, bytes]]:
+    """
+    Разбивает поток байтов NDJSON на строки по мере поступления данных.
+    Пустые строки пропускаются, нумерация строк сохраняется.
+    Разбирается только новый фрагмент, а начало незавершенной строки хранится
+    частями, поэтому каждый байт копируется не больше двух раз.
+
+    Args:
+        chunks: Поток фрагментов тела запроса
+        max_line_bytes: Максимальная длина строки
+
+    Yields:
+        tuple[int, bytes]: Номер строки (с единицы) и ее содержимое
+
+    Raises:
+        ItemTooLarge: Если строка длиннее max_line_bytes
+    """
+    pending: list[bytes] = []
+    pending_size = 0
+    line_no = 0
+
+    async for chunk in chunks:
+        start = 0
+        while (end := chunk.find(b"\n", start)) != -1:
+            line_no += 1
+            if pending_size + end - start > max_line_bytes:
+                raise ItemTooLarge(line_no, max_line_bytes)
+            line = b"".join(pending) + chunk[start:end] if pending else chunk[start:end]
+            pending, pending_size = [], 0
+            start = end + 1
+            if line.strip():
+                yield line_no, line
+
+        if start < len(chunk):
+            pending.append(chunk[start:])
+            pending_size += len(chunk) - start
+            if pending_size > max_line_bytes:
+                raise ItemTooLarge(line_no + 1, max_line_bytes)
+
+    line = b"".join(pending)
+    if line.strip():
+        yield line_no + 1, line
+
+
+async def iter_json_array(
+        chunks: AsyncIterable[bytes],
+        max_item_bytes: int,
+) -> AsyncIterator[tuple[int, Any]]:
+    """
+    Разбирает JSON-массив из потока байтов поэлементно по мере поступления данных,
+    не дожидаясь конца тела запроса. В памяти хранится только незавершенный элемент.
+
+    Args:
+        chunks: Поток фрагментов тела запроса
+        max_item_bytes: Максимальная длина одного элемента
+
+    Yields:
+        tuple[int, Any]: Номер элемента (с единицы) и сам элемент
+
+    Raises:
+        ValueError: Если тело не является JSON-массивом
+        ItemTooLarge: Если элемент длиннее max_item_bytes
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = aiter(chunks)
+    buffer, pos = "", 0
+    finished = False
+    started = False
+    after_item = False
+    index = 0
+
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+
+        if pos < len(buffer):
+            char = buffer[pos]
+            if not started:
+                if char != "[":
+                    raise ValueError("Ожидается JSON-массив")
+                started = True
+                pos += 1
+                continue
+
+            if char == "]" and (after_item or not index):
+                if buffer[pos + 1:].strip():
+                    raise ValueError("Данные после конца JSON-массива")
+                async for chunk in chunks:
+                    if utf8.decode(chunk).strip():
+                        raise ValueError("Данные после конца JSON-массива")
+                return
+
+            if after_item:
+                if char != ",":
+                    raise ValueError(f"Ожидается ',' или ']' после элемента {index}")
+                after_item = False
+                pos += 1
+                continue
+
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+
+            # Элемент принимается, только если за ним уже есть данные: иначе
+            # число на границе фрагментов ("12" + "3") было бы разобрано не целиком
+            if end is not None and (end < len(buffer) or finished):
+                index += 1
+                if end - pos > max_item_bytes:
+                    raise ItemTooLarge(index, max_item_bytes)
+                yield index, item
+                pos, after_item = end, True
+                continue
+
+            if finished:
+                raise ValueError(f"Некорректный элемент {index + 1}")
+            if len(buffer) - pos > max_item_bytes:
+                raise ItemTooLarge(index + 1, max_item_bytes)
+
+        elif finished:
+            raise ValueError("Неожиданный конец JSON-массива")
+
+        # Разобранная часть отбрасывается только при чтении следующего фрагмента
+        try:
+            buffer, pos = buffer[pos:] + utf8.decode(await anext(chunks)), 0
+        except StopAsyncIteration:
+            buffer, pos = buffer[pos:] + utf8.decode(b"", final=True), 0
+            finished = True
@@ -0,0 +1,109 @@
+import asyncio
+import json
+from typing import Any
+
+import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractRobustConnection
+from aio_pika.pool import Pool
+
+from app.core.config import settings
+from app.utils.logging import app_logger as logger
+
+PACKAGE_EXCHANGE = "package_exchange"
+
+
+def get_rabbitmq_url() -> str:
+    """
+    Собирает URL подключения к RabbitMQ из настроек.
+
+    Returns:
+        str: URL подключения
+    """
+    return (
+        f"amqp://{settings.RABBITMQ_USER}:{settings.RABBITMQ_PASSWORD}"
+        f"@{settings.RABBITMQ_HOST}:{settings.RABBITMQ_PORT}/{settings.RABBITMQ_VHOST}"
+    )
+
+
+class RabbitMQPublisher:
+    """
+    Долгоживущий издатель сообщений в RabbitMQ.
+
+    Держит одно устойчивое (robust) соединение на процесс и пул каналов поверх него.
+    Обменник объявляется один раз при подключении, после чего каждая публикация
+    только берет канал из пула. При разрыве соединения aio_pika восстанавливает
+    его и каналы автоматически.
+    """
+
+    def __init__(self, pool_size: int = settings.RABBITMQ_CHANNEL_POOL_SIZE):
+        self.pool_size = pool_size
+        self.connection: AbstractRobustConnection | None = None
+        self.channel_pool: Pool[AbstractChannel] | None = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self) -> None:
+        """
+        Устанавливает соединение с RabbitMQ и объявляет обменник.
+        Повторный вызов при активном соединении ничего не делает.
+        """
+        async with self._lock:
+            if self.channel_pool is not None:
+                return
+
+            logger.info(f"Connecting publisher to RabbitMQ at {settings.RABBITMQ_HOST}:{settings.RABBITMQ_PORT}")
+
+            self.connection = await aio_pika.connect_robust(get_rabbitmq_url())
+
+            async with self.connection.channel() as channel:
+                await channel.declare_exchange(
+                    PACKAGE_EXCHANGE,
+                    aio_pika.ExchangeType.DIRECT,
+                    durable=True
+                )
+
+            self.channel_pool = Pool(self._open_channel, max_size=self.pool_size)
+
+            logger.info("Publisher connected to RabbitMQ")
+
+    async def _open_channel(self) -> AbstractChannel:
+        return await self.connection.channel()
+
+    async def publish(self, data: Any, routing_key: str) -> None:
+        """
+        Публикует сообщение в обменник посылок.
+        Каналы открываются с подтверждениями публикации, поэтому вызов
+        завершается только после подтверждения брокером.
+
+        Args:
+            data: Данные сообщения (сериализуются в JSON)
+            routing_key: Ключ маршрутизации
+        """
+        if self.channel_pool is None:
+            await self.connect()
+
+        message = aio_pika.Message(
+            body=json.dumps(data).encode(),
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+        )
+
+        async with self.channel_pool.acquire() as channel:
+            if channel.is_closed:
+                await channel.reopen()
+            exchange = await channel.get_exchange(PACKAGE_EXCHANGE, ensure=False)
+            await exchange.publish(message, routing_key=routing_key)
+
+    async def close(self) -> None:
+        """
+        Закрывает пул каналов и соединение с RabbitMQ.
+        """
+        async with self._lock:
+            if self.channel_pool is not None:
+                await self.channel_pool.close()
+                self.channel_pool = None
+            if self.connection is not None:
+                await self.connection.close()
+                self.connection = None
+                logger.info("Publisher disconnected from RabbitMQ")
+
+
+publisher = RabbitMQPublisher()
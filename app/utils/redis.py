@@ -73,3 +73,27 @@ async def delete_cache(key: str) -> bool:
         bool: True если успешно, иначе False
     """
     return await redis_client.delete(key) > 0
+
+
+async def set_hash(key: str, mapping: dict[str, Any], ttl: int | None = None) -> bool:
+    """
+    Атомарно заменяет хэш Redis новым набором полей.
+
+    Args:
+        key: Ключ хэша
+        mapping: Поля и значения
+        ttl: Время жизни в секундах
+
+    Returns:
+        bool: True если успешно, иначе False
+    """
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            if ttl:
+                pipe.expire(key, ttl)
+            await pipe.execute()
+        return True
+    except Exception:
+        return False
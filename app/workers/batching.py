@@ -0,0 +1,95 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from aio_pika.abc import AbstractIncomingMessage
+
+from app.utils.logging import app_logger as logger
+
+BatchHandler = Callable[[list[AbstractIncomingMessage]], Awaitable[None]]
+
+
+class MessageBatcher:
+    """
+    Накапливает входящие сообщения и передает их обработчику пачками.
+
+    Пачка отправляется на обработку, когда набрано max_size сообщений
+    или с момента прихода первого сообщения прошло max_wait секунд.
+    В пачке никогда не бывает больше max_size сообщений: пришедшие во время
+    обработки остаются в буфере до следующей пачки.
+    Подтверждение (ack/nack) сообщений остается на стороне обработчика.
+    """
+
+    def __init__(self, handler: BatchHandler, max_size: int, max_wait: float):
+        self.handler = handler
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._buffer: list[AbstractIncomingMessage] = []
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+        self._closed = False
+
+    async def add(self, message: AbstractIncomingMessage) -> None:
+        """
+        Добавляет сообщение в текущую пачку.
+        Используется как callback для queue.consume().
+
+        Args:
+            message: Входящее сообщение из RabbitMQ
+        """
+        if self._closed:
+            await message.nack(requeue=True)
+            return
+
+        self._buffer.append(message)
+
+        if len(self._buffer) >= self.max_size:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.max_wait)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Передает обработчику пачку из первых max_size сообщений буфера.
+        Пока в буфере набирается полная пачка, обработка продолжается;
+        для неполного остатка запускается таймер. После close() буфер
+        обрабатывается целиком.
+        """
+        async with self._lock:
+            self._cancel_timer()
+
+            while self._buffer:
+                batch = self._buffer[:self.max_size]
+                del self._buffer[:self.max_size]
+                await self._process(batch)
+
+                if len(self._buffer) < self.max_size and not self._closed:
+                    break
+
+            if self._buffer and self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+    async def _process(self, batch: list[AbstractIncomingMessage]) -> None:
+        try:
+            await self.handler(batch)
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(batch)} messages: {str(e)}")
+            for message in batch:
+                if not message.processed:
+                    await message.nack(requeue=False)
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+
+    async def close(self) -> None:
+        """
+        Обрабатывает накопленные сообщения и останавливает таймер.
+        Сообщения, пришедшие после закрытия, возвращаются в очередь.
+        """
+        self._closed = True
+        await self.flush()
@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.base import async_session
+from app.models.user_session import UserSession
+from app.services.package_counter import reconcile_counters
+from app.utils.logging import setup_logging, app_logger as logger
+from app.utils.redis import delete_cache, redis_client
+
+RECONCILE_LOCK_KEY = "reconcile:package_counters:lock"
+RECONCILE_LOCK_TTL = 300
+
+
+async def reconcile_package_counters(
+        session_maker: async_sessionmaker[AsyncSession],
+        chunk_size: int = settings.COUNTERS_RECONCILE_CHUNK_SIZE,
+) -> int:
+    """
+    Сверяет счетчики посылок с таблицей посылок и исправляет расхождения.
+
+    Сессии пользователей обходятся порциями по возрастанию ID, каждая порция
+    сверяется в отдельной короткой транзакции, отдельной от выборки ID. Одновременно выполняется
+    не более одной сверки.
+
+    Args:
+        session_maker: Фабрика сессий базы данных
+        chunk_size: Количество сессий пользователей в порции
+
+    Returns:
+        int: Количество исправленных счетчиков
+    """
+    if not await redis_client.set(RECONCILE_LOCK_KEY, 1, nx=True, ex=RECONCILE_LOCK_TTL):
+        logger.warning("Package counters reconciliation is already running, skipping")
+        return 0
+
+    try:
+        last_id = 0
+        checked = 0
+        repaired = 0
+
+        async with session_maker() as session:
+            while True:
+                user_session_ids = (await session.scalars(
+                    select(UserSession.id)
+                    .where(UserSession.id > last_id)
+                    .order_by(UserSession.id)
+                    .limit(chunk_size)
+                )).all()
+                if not user_session_ids:
+                    break
+                # Выборка ID открыла снимок REPEATABLE READ; сверка должна начаться
+                # в новой транзакции, иначе посылки, созданные после этого момента, не будут учтены
+                await session.commit()
+
+                repaired += await reconcile_counters(session, user_session_ids)
+
+                last_id = user_session_ids[-1]
+                checked += len(user_session_ids)
+                await redis_client.expire(RECONCILE_LOCK_KEY, RECONCILE_LOCK_TTL)
+
+        if repaired:
+            logger.warning(f"Package counters reconciliation repaired {repaired} counters in {checked} sessions")
+        else:
+            logger.info(f"Package counters reconciliation found no drift in {checked} sessions")
+
+        return repaired
+    finally:
+        await delete_cache(RECONCILE_LOCK_KEY)
+
+
+async def run_reconcile(chunk_size: int) -> None:
+    """
+    Запускает сверку из командной строки.
+    """
+    setup_logging()
+    await reconcile_package_counters(async_session, chunk_size)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сверка счетчиков посылок с таблицей посылок")
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=settings.COUNTERS_RECONCILE_CHUNK_SIZE,
+        help="Количество сессий пользователей в порции"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(run_reconcile(args.chunk_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,43 @@
 import asyncio
 import json
+from typing import Any, Awaitable, Callable
 
 import aio_pika
-from aio_pika.abc import AbstractIncomingMessage
+from aio_pika.abc import AbstractIncomingMessage, AbstractQueue
 from sqlalchemy import select
+from sqlalchemy.exc import InterfaceError, OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.core.config import settings
 from app.db.base import async_session
 from app.models.user_session import UserSession
 from app.schemas.package import PackageCreate
-from app.services.package import calculate_and_update_shipping_cost, create_package
+from app.services.package import (
+    calculate_and_update_shipping_costs,
+    create_packages,
+)
+from app.services.id_allocator import package_id_allocator
+from app.services.package_events import publish_package_events, PACKAGE_CREATED
+from app.utils.http import close_http_client
 from app.utils.logging import app_logger as logger
+from app.utils.metrics import start_metrics_server
+from app.utils.rabbitmq import PACKAGE_EXCHANGE, get_rabbitmq_url, publisher
+from app.workers.batching import MessageBatcher
+from app.workers.shipping_cost_recompute import recompute_shipping_costs
+
+# Ошибки, после которых сообщение стоит обработать позже: недоступность базы,
+# ожидание блокировки, deadlock. Остальные ошибки считаются ошибками данных сообщения
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, ConnectionError, asyncio.TimeoutError)
+
+DEAD_LETTER_ROUTING_KEY = "package.dead"
+
+# Очереди отложенных повторов. Отклоненное (nack без requeue) сообщение рабочей очереди
+# попадает в очередь повторов, лежит там WORKER_RETRY_DELAY_MS и по истечении TTL
+# возвращается в рабочую очередь. Число попыток RabbitMQ ведет в заголовке x-death
+RETRY_QUEUES = {
+    "package.create": "package_create_retry_queue",
+    "package.calculate": "package_calculate_retry_queue",
+}
 
 
 class PackageProcessor:
@@ -25,39 +51,40 @@ class PackageProcessor:
         self.channel = None
         self.exchange = None
         self.queue = None
+        self.create_batcher: MessageBatcher | None = None
+        self.calculate_batcher: MessageBatcher | None = None
 
     async def connect(self) -> None:
         """
         Устанавливает соединение с RabbitMQ.
         """
         try:
-            rabbitmq_url = (
-                f"amqp://{settings.RABBITMQ_USER}:{settings.RABBITMQ_PASSWORD}"
-                f"@{settings.RABBITMQ_HOST}:{settings.RABBITMQ_PORT}/{settings.RABBITMQ_VHOST}"
-            )
-
             logger.info(f"Connecting to RabbitMQ at {settings.RABBITMQ_HOST}:{settings.RABBITMQ_PORT}")
 
-            self.connection = await aio_pika.connect_robust(rabbitmq_url)
+            self.connection = await aio_pika.connect_robust(get_rabbitmq_url())
             self.channel = await self.connection.channel()
+            await self.channel.set_qos(prefetch_count=settings.WORKER_PREFETCH_COUNT)
 
             self.exchange = await self.channel.declare_exchange(
-                "package_exchange",
+                PACKAGE_EXCHANGE,
                 aio_pika.ExchangeType.DIRECT,
                 durable=True
             )
 
-            self.calculate_queue = await self.channel.declare_queue(
-                "package_calculate_queue",
-                durable=True
-            )
-            self.create_queue = await self.channel.declare_queue(
-                "package_create_queue",
+            self.calculate_queue = await self._declare_work_queue("package_calculate_queue", "package.calculate")
+            self.create_queue = await self._declare_work_queue("package_create_queue", "package.create")
+
+            self.recompute_queue = await self.channel.declare_queue(
+                "package_recompute_queue",
                 durable=True
             )
 
-            await self.calculate_queue.bind(self.exchange, routing_key="package.calculate")
-            await self.create_queue.bind(self.exchange, routing_key="package.create")
+            await self.recompute_queue.bind(self.exchange, routing_key="package.recompute")
+
+            dead_letter_queue = await self.channel.declare_queue("package_dead_letter_queue", durable=True)
+            await dead_letter_queue.bind(self.exchange, routing_key=DEAD_LETTER_ROUTING_KEY)
+
+            await publisher.connect()
 
             logger.info("Successfully connected to RabbitMQ")
 
@@ -65,102 +92,377 @@ class PackageProcessor:
             logger.error(f"Failed to connect to RabbitMQ: {str(e)}")
             raise
 
-    async def process_message(self, message: AbstractIncomingMessage) -> None:
+    async def _declare_work_queue(self, name: str, routing_key: str) -> AbstractQueue:
         """
-        Обрабатывает входящее сообщение с данными о посылке.
-        
+        Объявляет рабочую очередь и ее очередь повторов.
+
         Args:
-            message: Входящее сообщение из RabbitMQ
+            name: Имя рабочей очереди
+            routing_key: Ключ маршрутизации рабочей очереди
+
+        Returns:
+            AbstractQueue: Рабочая очередь
         """
-        async with message.process():
-            try:
-                body = message.body.decode()
-                data = json.loads(body)
+        queue = await self.channel.declare_queue(
+            name,
+            durable=True,
+            arguments={
+                "x-dead-letter-exchange": PACKAGE_EXCHANGE,
+                "x-dead-letter-routing-key": f"{routing_key}.retry",
+            }
+        )
+        await queue.bind(self.exchange, routing_key=routing_key)
+
+        retry_queue = await self.channel.declare_queue(
+            RETRY_QUEUES[routing_key],
+            durable=True,
+            arguments={
+                "x-message-ttl": settings.WORKER_RETRY_DELAY_MS,
+                "x-dead-letter-exchange": PACKAGE_EXCHANGE,
+                "x-dead-letter-routing-key": routing_key,
+            }
+        )
+        await retry_queue.bind(self.exchange, routing_key=f"{routing_key}.retry")
 
-                routing_key = message.routing_key
+        return queue
 
-                if routing_key == "package.calculate":
-                    await self._process_calculate_message(data)
-                elif routing_key == "package.create":
-                    await self._process_create_message(data)
-                else:
-                    logger.warning(f"Unknown routing key: {routing_key}")
+    @staticmethod
+    def _attempts(message: AbstractIncomingMessage) -> int:
+        """
+        Количество уже неудачных попыток обработки по заголовку x-death.
+        """
+        attempts = 0
+        for death in (message.headers or {}).get("x-death") or []:
+            reason = death.get("reason")
+            if isinstance(reason, bytes):
+                reason = reason.decode()
+            if reason == "rejected":
+                attempts += int(death.get("count", 0))
+        return attempts
 
-            except Exception as e:
-                logger.error(f"Error processing message: {str(e)}")
+    async def process_message(self, message: AbstractIncomingMessage) -> None:
+        """
+        Обрабатывает одиночное сообщение (при размере пачки 1) так же,
+        как пачку из одного сообщения, включая повторы и карантин.
 
-    async def _process_calculate_message(self, data: dict) -> None:
+        Args:
+            message: Входящее сообщение из RabbitMQ
         """
-        Обрабатывает сообщение для расчета стоимости доставки.
-        
+        if message.routing_key == "package.create":
+            await self.process_create_batch([message])
+        elif message.routing_key == "package.calculate":
+            await self.process_calculate_batch([message])
+        else:
+            await self._dead_letter(message, ValueError(f"Unknown routing key: {message.routing_key}"))
+
+    async def _retry_later(self, message: AbstractIncomingMessage, error: Exception) -> None:
+        """
+        Отклоняет сообщение без возврата в очередь: через dead-letter обменник
+        оно попадает в очередь повторов и возвращается через WORKER_RETRY_DELAY_MS.
+        После WORKER_MAX_RETRIES попыток сообщение отправляется в карантин.
+
         Args:
-            data: Данные сообщения
+            message: Сообщение, которое не удалось обработать
+            error: Ошибка обработки
         """
-        package_id = data.get("package_id")
-        if not package_id:
-            logger.error(f"Invalid message format - missing package_id: {data}")
+        attempts = self._attempts(message)
+        if attempts >= settings.WORKER_MAX_RETRIES or message.routing_key not in RETRY_QUEUES:
+            await self._dead_letter(message, error)
             return
 
-        logger.info(f"Processing package with ID: {package_id}")
+        logger.warning(f"Retrying {message.routing_key} message later (attempt {attempts + 1}): {str(error)}")
+        await message.nack(requeue=False)
 
-        async with self.session_maker() as session:
-            shipping_cost = await calculate_and_update_shipping_cost(
-                db=session,
-                package_id=package_id
+    async def _dead_letter(self, message: AbstractIncomingMessage, error: Exception) -> None:
+        """
+        Перекладывает сообщение в очередь package_dead_letter_queue вместе
+        с исходным ключом маршрутизации и текстом ошибки для разбора вручную.
+
+        Args:
+            message: Сообщение, которое не удалось обработать
+            error: Ошибка обработки
+        """
+        logger.error(f"Moving {message.routing_key} message to dead letter queue: {str(error)}")
+        try:
+            await self.exchange.publish(
+                aio_pika.Message(
+                    body=message.body,
+                    headers={
+                        **(message.headers or {}),
+                        "x-original-routing-key": message.routing_key,
+                        "x-error": str(error)[:1000],
+                    },
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=DEAD_LETTER_ROUTING_KEY
             )
+        except Exception as e:
+            logger.error(f"Failed to dead-letter {message.routing_key} message: {str(e)}")
+            await message.nack(requeue=True)
+            return
 
-            if shipping_cost is not None:
-                logger.info(f"Package {package_id}: calculated shipping cost {shipping_cost:.2f}")
-            else:
-                logger.error(f"Package {package_id}: failed to calculate shipping cost")
+        await message.ack()
 
-    async def _process_create_message(self, data: dict) -> None:
+    async def _handle_batch_error(
+            self,
+            error: Exception,
+            messages: list[tuple[AbstractIncomingMessage, Any]],
+            handler: Callable[[Any], Awaitable[Any]],
+    ) -> None:
         """
-        Обрабатывает сообщение для создания новой посылки.
-        
+        Обрабатывает ошибку пачки. При временной ошибке (база недоступна)
+        все сообщения откладываются на повтор. Иначе сообщения обрабатываются
+        по одному, чтобы найти некорректные: успешные подтверждаются,
+        упавшие откладываются или отправляются в карантин.
+
         Args:
-            data: Данные сообщения
+            error: Ошибка обработки пачки
+            messages: Пары (сообщение, разобранные данные сообщения)
+            handler: Обработчик данных одного сообщения
         """
-        package_data = data.get("package_data")
-        if not package_data:
-            logger.error(f"Invalid message format - missing package_data: {data}")
+        if isinstance(error, TRANSIENT_ERRORS) or len(messages) == 1:
+            for message, _ in messages:
+                await self._fail(message, error)
             return
 
-        logger.info(f"Creating new package: {package_data.get('name')}")
+        for message, payload in messages:
+            try:
+                await handler(payload)
+            except Exception as e:
+                await self._fail(message, e)
+            else:
+                await message.ack()
+
+    async def _fail(self, message: AbstractIncomingMessage, error: Exception) -> None:
+        """
+        Откладывает сообщение на повтор при временной ошибке,
+        иначе отправляет его в карантин.
+        """
+        if isinstance(error, TRANSIENT_ERRORS):
+            await self._retry_later(message, error)
+        else:
+            await self._dead_letter(message, error)
+
+    async def process_recompute_message(self, message: AbstractIncomingMessage) -> None:
+        """
+        Обрабатывает сообщение о пересчете стоимости доставки всех посылок.
+        Сообщение подтверждается сразу: пересчет может идти дольше таймаута
+        подтверждения RabbitMQ, а прерванный пересчет продолжается с контрольной точки.
+
+        Args:
+            message: Входящее сообщение из RabbitMQ (необязательные usd_to_rub_rate и resume)
+        """
+        async with message.process():
+            try:
+                data = json.loads(message.body.decode())
+            except Exception as e:
+                logger.error(f"Invalid package.recompute message: {str(e)}")
+                return
+
+        logger.info(f"Starting shipping cost recompute: {data}")
 
         try:
-            async with self.session_maker() as session:
-                user_session_id = package_data.get("user_session_id")
-                result = await session.execute(
-                    select(UserSession).where(UserSession.id == user_session_id)
-                )
-                user_session = result.scalars().first()
+            await recompute_shipping_costs(
+                self.session_maker,
+                usd_to_rub_rate=data.get("usd_to_rub_rate"),
+                resume=bool(data.get("resume", False))
+            )
+        except Exception as e:
+            logger.error(f"Shipping cost recompute failed: {str(e)}")
+
+    @staticmethod
+    def _parse_create_items(data: dict) -> list[tuple[int | None, PackageCreate, int]]:
+        """
+        Извлекает посылки из сообщения package.create.
+        Сообщение содержит одну посылку в package_data
+        или список посылок в packages_data.
 
-                if not user_session:
-                    raise Exception(f"User session with ID {user_session_id} not found")
+        Args:
+            data: Данные сообщения
 
-                package_in = PackageCreate(
+        Returns:
+            list[tuple[int | None, PackageCreate, int]]: Тройки (ID посылки, выданный API,
+                данные посылки, ID сессии пользователя)
+        """
+        packages_data = data.get("packages_data") or [data["package_data"]]
+        return [
+            (
+                package_data.get("package_id"),
+                PackageCreate(
                     name=package_data.get("name"),
                     weight=package_data.get("weight"),
                     price_usd=package_data.get("price_usd"),
                     package_type_id=package_data.get("package_type_id")
-                )
+                ),
+                package_data["user_session_id"],
+            )
+            for package_data in packages_data
+        ]
 
-                package = await create_package(
-                    db=session,
-                    obj_in=package_in,
-                    user_session=user_session
-                )
+    async def _create_packages(self, items: list[tuple[int | None, PackageCreate, int]]) -> set[int]:
+        """
+        Создает посылки одной транзакцией, предварительно проверив
+        все упомянутые сессии пользователей одним запросом, уведомляет владельцев
+        событием package.created и отправляет посылки на расчет
+        стоимости одним сообщением.
+
+        ID посылок выдаются API, поэтому повторно доставленное сообщение
+        не создает дубликатов: уже существующие посылки пропускаются.
+        Посылкам из сообщений без ID (отправленных до появления выдачи ID в API)
+        ID выдается здесь.
+
+        Args:
+            items: Тройки (ID посылки, данные посылки, ID сессии пользователя)
 
-                await send_package_to_queue(
-                    {"package_id": package.id},
-                    routing_key="package.calculate"
+        Returns:
+            set[int]: ID найденных сессий пользователей; посылки остальных сессий пропускаются
+        """
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(UserSession.id).where(UserSession.id.in_({user_session_id for *_, user_session_id in items}))
+            )
+            existing_session_ids = set(result.scalars().all())
+
+            missing_session_ids = {user_session_id for *_, user_session_id in items} - existing_session_ids
+            if missing_session_ids:
+                logger.error(f"User sessions with IDs {sorted(missing_session_ids)} not found")
+
+            items = [item for item in items if item[2] in existing_session_ids]
+
+            without_id = sum(1 for package_id, *_ in items if package_id is None)
+            if without_id:
+                new_ids = iter(await package_id_allocator.allocate(without_id))
+                items = [
+                    (next(new_ids) if package_id is None else package_id, obj_in, user_session_id)
+                    for package_id, obj_in, user_session_id in items
+                ]
+
+            created = await create_packages(db=session, objs_in=items)
+
+        if len(created) < len(items):
+            logger.info(f"Skipped {len(items) - len(created)} already created packages")
+
+        if created:
+            await publish_package_events(
+                (
+                    user_session_id,
+                    {
+                        "event": PACKAGE_CREATED,
+                        "package_id": package_id,
+                        "name": obj_in.name,
+                        "package_type_id": obj_in.package_type_id,
+                    }
                 )
+                for package_id, obj_in, user_session_id in created
+            )
+
+        # Расчет отправляется и для уже существующих посылок: при повторной доставке
+        # предыдущая попытка могла завершиться до отправки сообщения, а пересчет идемпотентен
+        if items:
+            await send_package_to_queue(
+                {"package_ids": [package_id for package_id, *_ in items]},
+                routing_key="package.calculate"
+            )
+            logger.info(f"Created {len(created)} packages and sent {len(items)} for cost calculation")
+
+        return existing_session_ids
+
+    async def process_create_batch(self, messages: list[AbstractIncomingMessage]) -> None:
+        """
+        Обрабатывает пачку сообщений о создании посылок:
+        одним запросом проверяет сессии пользователей, создает все посылки
+        одной транзакцией и подтверждает сообщения. Сообщения с некорректными
+        данными или несуществующей сессией отправляются в карантин.
+        При ошибке создания сообщения не подтверждаются, а откладываются
+        на повтор или отправляются в карантин (см. _handle_batch_error).
+
+        Args:
+            messages: Пачка входящих сообщений из RabbitMQ
+        """
+        parsed = []
+        for message in messages:
+            try:
+                parsed.append((message, self._parse_create_items(json.loads(message.body.decode()))))
+            except Exception as e:
+                await self._dead_letter(message, e)
+
+        if not parsed:
+            return
+
+        try:
+            existing_session_ids = await self._create_packages(
+                [item for _, items in parsed for item in items]
+            )
+        except Exception as e:
+            logger.error(f"Error creating batch of {len(parsed)} messages: {str(e)}")
+            await self._handle_batch_error(e, parsed, self._create_packages)
+            return
+
+        for message, items in parsed:
+            if any(user_session_id in existing_session_ids for *_, user_session_id in items):
+                await message.ack()
+            else:
+                await self._dead_letter(message, ValueError("User session not found"))
+
+    async def process_calculate_batch(self, messages: list[AbstractIncomingMessage]) -> None:
+        """
+        Обрабатывает пачку сообщений о расчете стоимости доставки:
+        собирает ID посылок из всех сообщений и рассчитывает их одним проходом.
+        Сообщение может содержать один package_id или список package_ids.
+        При ошибке расчета сообщения откладываются на повтор
+        или отправляются в карантин (см. _handle_batch_error).
+
+        Args:
+            messages: Пачка входящих сообщений из RabbitMQ
+        """
+        parsed = []
+        for message in messages:
+            try:
+                data = json.loads(message.body.decode())
+                ids = data.get("package_ids") or [data["package_id"]]
+                parsed.append((message, [int(package_id) for package_id in ids]))
+            except Exception as e:
+                await self._dead_letter(message, e)
+
+        if not parsed:
+            return
 
-                logger.info(f"Package created with ID: {package.id} and sent for cost calculation")
+        package_ids = [package_id for _, ids in parsed for package_id in ids]
+        logger.info(f"Calculating shipping cost for batch of {len(package_ids)} packages")
 
+        try:
+            shipping_costs = await self._calculate_shipping_costs(package_ids)
         except Exception as e:
-            logger.error(f"Error creating package: {str(e)}")
+            logger.error(f"Error calculating batch of {len(parsed)} messages: {str(e)}")
+            await self._handle_batch_error(e, parsed, self._calculate_shipping_costs)
+            return
+
+        for message, _ in parsed:
+            await message.ack()
+
+        logger.info(f"Calculated shipping cost for {len(shipping_costs)} packages")
+
+    async def _calculate_shipping_costs(self, package_ids: list[int]) -> dict[int, float]:
+        """
+        Рассчитывает стоимость доставки посылок в отдельной сессии базы данных.
+
+        Args:
+            package_ids: ID посылок
+
+        Returns:
+            dict[int, float]: Рассчитанная стоимость доставки по ID найденных посылок
+        """
+        async with self.session_maker() as session:
+            shipping_costs = await calculate_and_update_shipping_costs(
+                db=session,
+                package_ids=package_ids
+            )
+
+        missing = set(package_ids) - shipping_costs.keys()
+        if missing:
+            logger.error(f"Packages not found for cost calculation: {sorted(missing)}")
+
+        return shipping_costs
 
     async def start_consuming(self) -> None:
         """
@@ -170,13 +472,37 @@ class PackageProcessor:
 
         logger.info("Starting to consume messages from package queues")
 
-        await self.calculate_queue.consume(self.process_message)
-        await self.create_queue.consume(self.process_message)
+        if settings.WORKER_CALCULATE_BATCH_SIZE > 1:
+            self.calculate_batcher = MessageBatcher(
+                self.process_calculate_batch,
+                max_size=settings.WORKER_CALCULATE_BATCH_SIZE,
+                max_wait=settings.WORKER_CALCULATE_BATCH_TIMEOUT_MS / 1000
+            )
+            await self.calculate_queue.consume(self.calculate_batcher.add)
+        else:
+            await self.calculate_queue.consume(self.process_message)
+
+        if settings.WORKER_CREATE_BATCH_SIZE > 1:
+            self.create_batcher = MessageBatcher(
+                self.process_create_batch,
+                max_size=settings.WORKER_CREATE_BATCH_SIZE,
+                max_wait=settings.WORKER_CREATE_BATCH_TIMEOUT_MS / 1000
+            )
+            await self.create_queue.consume(self.create_batcher.add)
+        else:
+            await self.create_queue.consume(self.process_message)
+
+        await self.recompute_queue.consume(self.process_recompute_message)
 
     async def close(self) -> None:
         """
         Закрывает соединение с RabbitMQ.
         """
+        if self.create_batcher:
+            await self.create_batcher.close()
+        if self.calculate_batcher:
+            await self.calculate_batcher.close()
+        await publisher.close()
         if self.connection:
             await self.connection.close()
             logger.info("Closed connection to RabbitMQ")
@@ -185,7 +511,7 @@ class PackageProcessor:
 # Функция для отправки сообщения в очередь RabbitMQ
 async def send_package_to_queue(data: dict, routing_key: str = "package.calculate") -> bool:
     """
-    Отправляет сообщение в очередь RabbitMQ.
+    Отправляет сообщение в очередь RabbitMQ через общий для процесса издатель.
     
     Args:
         data: Данные для отправки
@@ -195,35 +521,10 @@ async def send_package_to_queue(data: dict, routing_key: str = "package.calculat
         bool: True в случае успеха, False в случае ошибки
     """
     try:
-        rabbitmq_url = (
-            f"amqp://{settings.RABBITMQ_USER}:{settings.RABBITMQ_PASSWORD}"
-            f"@{settings.RABBITMQ_HOST}:{settings.RABBITMQ_PORT}/{settings.RABBITMQ_VHOST}"
-        )
+        await publisher.publish(data, routing_key=routing_key)
 
-        connection = await aio_pika.connect_robust(rabbitmq_url)
-
-        async with connection:
-            channel = await connection.channel()
-
-            exchange = await channel.declare_exchange(
-                "package_exchange",
-                aio_pika.ExchangeType.DIRECT,
-                durable=True
-            )
-
-            message_body = json.dumps(data).encode()
-            message = aio_pika.Message(
-                body=message_body,
-                delivery_mode=aio_pika.DeliveryMode.PERSISTENT
-            )
-
-            await exchange.publish(
-                message,
-                routing_key=routing_key
-            )
-
-            logger.info(f"Sent message with routing key {routing_key} to RabbitMQ")
-            return True
+        logger.info(f"Sent message with routing key {routing_key} to RabbitMQ")
+        return True
 
     except Exception as e:
         logger.error(f"Failed to send message to queue: {str(e)}")
@@ -235,8 +536,17 @@ async def run_worker() -> None:
     Запускает воркер для обработки посылок.
     """
     worker = PackageProcessor(async_session)
+    metrics_server = None
 
     try:
+        if settings.WORKER_METRICS_PORT:
+            metrics_server = await start_metrics_server(
+                settings.WORKER_METRICS_HOST,
+                settings.WORKER_METRICS_PORT,
+                read_timeout=settings.WORKER_METRICS_READ_TIMEOUT,
+            )
+            logger.info(f"Serving worker metrics on port {settings.WORKER_METRICS_PORT}")
+
         await worker.start_consuming()
 
         await asyncio.Future()
@@ -246,7 +556,11 @@ async def run_worker() -> None:
     except Exception as e:
         logger.error(f"Worker error: {str(e)}")
     finally:
+        if metrics_server:
+            metrics_server.close()
+            await metrics_server.wait_closed()
         await worker.close()
+        await close_http_client()
 
 
 def start_worker():
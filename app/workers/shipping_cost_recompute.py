@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.base import async_session
+from app.models.package import Package
+from app.services.currency import get_usd_to_rub_rate
+from app.services.package import update_shipping_costs
+from app.services.shipping_cost import compute_shipping_cost
+from app.utils.logging import setup_logging, app_logger as logger
+from app.utils.redis import get_cache, set_cache, delete_cache, redis_client
+
+RECOMPUTE_CHECKPOINT_KEY = "recompute:shipping_cost:last_id"
+RECOMPUTE_LOCK_KEY = "recompute:shipping_cost:lock"
+RECOMPUTE_LOCK_TTL = 300
+
+
+async def recompute_shipping_costs(
+        session_maker: async_sessionmaker[AsyncSession],
+        usd_to_rub_rate: float | None = None,
+        chunk_size: int = settings.RECOMPUTE_CHUNK_SIZE,
+        resume: bool = False,
+) -> int:
+    """
+    Пересчитывает стоимость доставки для всех посылок по текущему курсу.
+
+    Таблица читается порциями по возрастанию ID (keyset-пагинация), каждая порция
+    записывается одним UPDATE. После каждой порции последний обработанный ID
+    сохраняется в Redis, поэтому прерванный пересчет можно продолжить с resume=True.
+    Одновременно выполняется не более одного пересчета.
+
+    Args:
+        session_maker: Фабрика сессий базы данных
+        usd_to_rub_rate: Курс доллара к рублю; если не указан, берется текущий
+        chunk_size: Размер порции
+        resume: Продолжить с сохраненной контрольной точки
+
+    Returns:
+        int: Количество пересчитанных посылок
+    """
+    if not await redis_client.set(RECOMPUTE_LOCK_KEY, 1, nx=True, ex=RECOMPUTE_LOCK_TTL):
+        logger.warning("Shipping cost recompute is already running, skipping")
+        return 0
+
+    try:
+        if usd_to_rub_rate is None:
+            usd_to_rub_rate = await get_usd_to_rub_rate()
+
+        last_id = int(await get_cache(RECOMPUTE_CHECKPOINT_KEY) or 0) if resume else 0
+        processed = 0
+
+        logger.info(f"Recomputing shipping costs at rate {usd_to_rub_rate} starting after ID {last_id}")
+
+        async with session_maker() as session:
+            max_id = await session.scalar(select(func.max(Package.id))) or 0
+
+            while True:
+                result = await session.execute(
+                    select(Package.id, Package.weight, Package.price_usd)
+                    .where(Package.id > last_id)
+                    .order_by(Package.id)
+                    .limit(chunk_size)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+
+                await update_shipping_costs(session, {
+                    row.id: compute_shipping_cost(row.weight, row.price_usd, usd_to_rub_rate)
+                    for row in rows
+                })
+
+                last_id = rows[-1].id
+                processed += len(rows)
+                await set_cache(RECOMPUTE_CHECKPOINT_KEY, last_id)
+                await redis_client.expire(RECOMPUTE_LOCK_KEY, RECOMPUTE_LOCK_TTL)
+
+                logger.info(f"Recomputed {processed} packages, last ID {last_id} of {max_id}")
+
+        await delete_cache(RECOMPUTE_CHECKPOINT_KEY)
+        logger.info(f"Shipping cost recompute finished: {processed} packages")
+
+        return processed
+    finally:
+        await delete_cache(RECOMPUTE_LOCK_KEY)
+
+
+async def run_recompute(usd_to_rub_rate: float | None, chunk_size: int, resume: bool) -> None:
+    """
+    Запускает пересчет из командной строки.
+    """
+    setup_logging()
+    await recompute_shipping_costs(async_session, usd_to_rub_rate, chunk_size, resume)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пересчет стоимости доставки всех посылок")
+    parser.add_argument("--rate", type=float, default=None, help="Курс доллара к рублю (по умолчанию текущий)")
+    parser.add_argument("--chunk-size", type=int, default=settings.RECOMPUTE_CHUNK_SIZE, help="Размер порции")
+    parser.add_argument("--resume", action="store_true", help="Продолжить с последней контрольной точки")
+    args = parser.parse_args()
+
+    asyncio.run(run_recompute(args.rate, args.chunk_size, args.resume))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Нагрузочный тест привязки посылок к транспортным компаниям.
+
+Создает посылки через API, дожидается их обработки воркером и запускает
+конкурирующих перевозчиков. Отчет содержит пропускную способность,
+задержки p50/p99, долю ответов 409 и проверку того, что каждая посылка
+досталась ровно одной компании.
+
+Режимы:
+    assign - каждый перевозчик пытается привязать все посылки по одной
+             (POST /packages/{package_id}/assign-company)
+    claim  - перевозчики забирают свободные посылки пачками (POST /packages/claim).
+             Забираются все свободные посылки в базе, а не только созданные
+             тестом, поэтому режим запускается только с флагом --destructive
+
+Пример (docker-compose up, API на localhost:8000):
+    python benchmarks/assign_company.py --packages 2000 --carriers 50 --mode assign
+    python benchmarks/assign_company.py --packages 2000 --carriers 50 --mode claim --destructive
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+import httpx
+
+
+@dataclass
+class Stats:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    # ID посылки -> ID компаний, получивших успешный ответ
+    winners: dict[int, list[int]] = field(default_factory=lambda: defaultdict(list))
+
+    def record(self, started: float, status: int) -> None:
+        self.latencies.append(time.perf_counter() - started)
+        self.statuses[status] += 1
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def create_packages(client: httpx.AsyncClient, count: int) -> list[int]:
+    packages = [
+        {"name": f"bench-{i}", "weight": 1.0 + i % 10, "price_usd": 10.0 + i % 100, "package_type_id": 1}
+        for i in range(count)
+    ]
+    response = await client.post("/packages/bulk", json=packages)
+    response.raise_for_status()
+    return response.json()["data"]["package_ids"]
+
+
+async def wait_processed(client: httpx.AsyncClient, count: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = await client.get("/packages/", params={"page_size": 1, "has_shipping_cost": True})
+        response.raise_for_status()
+        total = response.json()["total"]
+        print(f"\rprocessed by worker: {total}/{count}", end="", flush=True)
+        if total >= count:
+            print()
+            return
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"Worker did not process {count} packages in {timeout} seconds")
+
+
+async def assign_carrier(
+        client: httpx.AsyncClient,
+        company_id: int,
+        package_ids: list[int],
+        stats: Stats,
+) -> None:
+    package_ids = random.sample(package_ids, len(package_ids))
+    for package_id in package_ids:
+        started = time.perf_counter()
+        response = await client.post(
+            f"/packages/{package_id}/assign-company",
+            json={"shipping_company_id": company_id}
+        )
+        stats.record(started, response.status_code)
+        if response.status_code == 200:
+            stats.winners[package_id].append(company_id)
+
+
+async def claim_carrier(
+        client: httpx.AsyncClient,
+        company_id: int,
+        batch_size: int,
+        stats: Stats,
+        max_failures: int,
+) -> None:
+    failures = 0
+    while True:
+        started = time.perf_counter()
+        response = await client.post(
+            "/packages/claim",
+            json={"shipping_company_id": company_id, "limit": batch_size}
+        )
+        stats.record(started, response.status_code)
+        if response.status_code != 200:
+            failures += 1
+            if failures >= max_failures:
+                print(f"carrier {company_id}: giving up after {failures} failed claims "
+                      f"(last status {response.status_code})")
+                return
+            await asyncio.sleep(min(0.05 * 2 ** failures, 2.0))
+            continue
+        failures = 0
+
+        claimed = response.json()["data"]["package_ids"]
+        if not claimed:
+            return
+        for package_id in claimed:
+            stats.winners[package_id].append(company_id)
+
+
+async def verify_owners(client: httpx.AsyncClient, package_ids: list[int], stats: Stats) -> list[str]:
+    """
+    Проверяет, что каждая посылка досталась ровно одной компании и что в базе
+    записана именно она: повторная привязка к владельцу должна быть успешной.
+    """
+    problems = []
+    for package_id in package_ids:
+        winners = stats.winners.get(package_id, [])
+        if len(winners) != 1:
+            problems.append(f"package {package_id}: {len(winners)} winners {winners}")
+            continue
+
+        response = await client.post(
+            f"/packages/{package_id}/assign-company",
+            json={"shipping_company_id": winners[0]}
+        )
+        if response.status_code != 200:
+            problems.append(f"package {package_id}: owner check returned {response.status_code}")
+    return problems
+
+
+async def run(args: argparse.Namespace) -> int:
+    limits = httpx.Limits(max_connections=args.carriers, max_keepalive_connections=args.carriers)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30.0) as client:
+        print(f"Creating {args.packages} packages")
+        package_ids = await create_packages(client, args.packages)
+        await wait_processed(client, args.packages, args.wait_timeout)
+
+        stats = Stats()
+        # Идентификаторы компаний уникальны для запуска, чтобы не пересекаться с прошлыми
+        base_company_id = int(time.time()) % 1_000_000 * 1000
+
+        started = time.perf_counter()
+        if args.mode == "assign":
+            carriers = [
+                assign_carrier(client, base_company_id + i, package_ids, stats)
+                for i in range(args.carriers)
+            ]
+        else:
+            carriers = [
+                claim_carrier(client, base_company_id + i, args.claim_batch, stats, args.max_failures)
+                for i in range(args.carriers)
+            ]
+        await asyncio.gather(*carriers)
+        elapsed = time.perf_counter() - started
+
+        requests_total = sum(stats.statuses.values())
+        print(f"mode:        {args.mode}")
+        print(f"carriers:    {args.carriers}")
+        print(f"requests:    {requests_total} in {elapsed:.2f}s ({requests_total / elapsed:.1f} req/s)")
+        print(f"assigned:    {len(stats.winners)} packages ({len(stats.winners) / elapsed:.1f} packages/s)")
+        print(f"latency:     p50 {percentile(stats.latencies, 0.5) * 1000:.1f}ms, "
+              f"p99 {percentile(stats.latencies, 0.99) * 1000:.1f}ms")
+        print(f"statuses:    {dict(stats.statuses)}")
+        print(f"409 rate:    {stats.statuses[409] / requests_total:.1%}")
+
+        if args.mode == "claim":
+            # В режиме claim могут попасться посылки прошлых запусков, проверяются только созданные сейчас
+            stats.winners = {package_id: stats.winners.get(package_id, []) for package_id in package_ids}
+
+        problems = await verify_owners(client, package_ids, stats)
+        if problems:
+            print(f"exactly-once: FAILED ({len(problems)} packages)")
+            for problem in problems[:20]:
+                print(f"  {problem}")
+            return 1
+
+        print("exactly-once: OK")
+        return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест привязки посылок к транспортным компаниям")
+    parser.add_argument("--url", default="http://localhost:8000/api/v1", help="Базовый адрес API")
+    parser.add_argument("--packages", type=int, default=1000, help="Количество посылок")
+    parser.add_argument("--carriers", type=int, default=20, help="Количество конкурирующих перевозчиков")
+    parser.add_argument("--mode", choices=["assign", "claim"], default="assign", help="Сценарий")
+    parser.add_argument("--claim-batch", type=int, default=10, help="Размер пачки в режиме claim")
+    parser.add_argument(
+        "--max-failures",
+        type=int,
+        default=5,
+        help="Сколько неудачных запросов подряд перевозчик выдерживает в режиме claim"
+    )
+    parser.add_argument("--wait-timeout", type=float, default=120.0, help="Ожидание обработки посылок воркером")
+    parser.add_argument(
+        "--destructive",
+        action="store_true",
+        help="Разрешить режим claim: он привязывает к компаниям все свободные посылки в базе"
+    )
+    args = parser.parse_args()
+
+    if args.mode == "claim" and not args.destructive:
+        parser.error(
+            "--mode claim assigns every claimable package in the database, not only the benchmark ones; "
+            "run it against a disposable database with --destructive"
+        )
+
+    raise SystemExit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""package_counters
+
+Revision ID: 3c9a4e7d1b52
+Revises: fbf171300e02
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3c9a4e7d1b52'
+down_revision = 'fbf171300e02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('package_counters',
+                    sa.Column('user_session_id', sa.Integer(), nullable=False),
+                    sa.Column('package_type_id', sa.Integer(), nullable=False),
+                    sa.Column('is_shipping_cost_calculated', sa.Boolean(), nullable=False),
+                    sa.Column('packages_count', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['package_type_id'], ['package_types.id'],
+                                            name=op.f('fk__package_counters__package_type_id__package_types')),
+                    sa.ForeignKeyConstraint(['user_session_id'], ['user_sessions.id'],
+                                            name=op.f('fk__package_counters__user_session_id__user_sessions')),
+                    sa.PrimaryKeyConstraint('user_session_id', 'package_type_id', 'is_shipping_cost_calculated',
+                                            name=op.f('pk__package_counters'))
+                    )
+    op.execute(
+        "INSERT INTO package_counters "
+        "(user_session_id, package_type_id, is_shipping_cost_calculated, packages_count) "
+        "SELECT user_session_id, package_type_id, is_shipping_cost_calculated, COUNT(*) "
+        "FROM packages "
+        "GROUP BY user_session_id, package_type_id, is_shipping_cost_calculated"
+    )
+
+
+def downgrade():
+    op.drop_table('package_counters')
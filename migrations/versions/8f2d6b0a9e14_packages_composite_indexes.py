@@ -0,0 +1,32 @@
+"""packages_composite_indexes
+
+Revision ID: 8f2d6b0a9e14
+Revises: 3c9a4e7d1b52
+Create Date: 2026-10-17 12:30:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '8f2d6b0a9e14'
+down_revision = '3c9a4e7d1b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix__packages__session_type_calculated_id', 'packages',
+                    ['user_session_id', 'package_type_id', 'is_shipping_cost_calculated', 'id'], unique=False)
+    op.create_index('ix__packages__session_calculated_id', 'packages',
+                    ['user_session_id', 'is_shipping_cost_calculated', 'id'], unique=False)
+    op.create_index('ix__packages__company_calculated_id', 'packages',
+                    ['shipping_company_id', 'is_shipping_cost_calculated', 'id'], unique=False)
+
+
+def downgrade():
+    # Индекс внешнего ключа user_session_id нужно вернуть до удаления составных индексов,
+    # которые MySQL использует вместо него
+    op.create_index('ix__packages_user_session_id', 'packages', ['user_session_id'], unique=False)
+    op.drop_index('ix__packages__company_calculated_id', table_name='packages')
+    op.drop_index('ix__packages__session_calculated_id', table_name='packages')
+    op.drop_index('ix__packages__session_type_calculated_id', table_name='packages')
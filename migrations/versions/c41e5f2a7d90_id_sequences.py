@@ -0,0 +1,31 @@
+"""id_sequences
+
+Revision ID: c41e5f2a7d90
+Revises: 8f2d6b0a9e14
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c41e5f2a7d90'
+down_revision = '8f2d6b0a9e14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('id_sequences',
+                    sa.Column('name', sa.String(length=50), nullable=False),
+                    sa.Column('next_value', sa.BigInteger(), nullable=False),
+                    sa.PrimaryKeyConstraint('name', name=op.f('pk__id_sequences'))
+                    )
+    op.execute(
+        "INSERT INTO id_sequences (name, next_value) "
+        "SELECT 'packages', COALESCE(MAX(id), 0) + 1 FROM packages"
+    )
+
+
+def downgrade():
+    op.drop_table('id_sequences')
@@ -0,0 +1,28 @@
+"""packages_session_id_indexes
+
+Revision ID: e5a1c7b3d942
+Revises: c41e5f2a7d90
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e5a1c7b3d942'
+down_revision = 'c41e5f2a7d90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Составные индексы 8f2d6b0a9e14 заменили неявный индекс внешнего ключа user_session_id
+    # (фактически (user_session_id, id)): без этих индексов список без фильтров и с фильтром
+    # только по типу посылки сортируется через filesort
+    op.create_index('ix__packages__session_id', 'packages', ['user_session_id', 'id'], unique=False)
+    op.create_index('ix__packages__session_type_id', 'packages',
+                    ['user_session_id', 'package_type_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix__packages__session_type_id', table_name='packages')
+    op.drop_index('ix__packages__session_id', table_name='packages')
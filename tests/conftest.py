@@ -0,0 +1,110 @@
+import os
+
+# Настройки читаются при импорте app.core.config, поэтому задаются до импорта приложения.
+# Значения совпадают с docker-compose; переменные окружения и .env имеют приоритет
+for name, value in {
+    "MYSQL_USER": "user",
+    "MYSQL_PASSWORD": "password",
+    "MYSQL_HOST": "localhost",
+    "MYSQL_PORT": "3306",
+    "MYSQL_DATABASE": "delivery_service",
+    "REDIS_HOST": "localhost",
+    "REDIS_PORT": "6379",
+    "RABBITMQ_HOST": "localhost",
+    "RABBITMQ_PORT": "5672",
+    "RABBITMQ_USER": "guest",
+    "RABBITMQ_PASSWORD": "guest",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app.db.base import Base  # noqa: E402
+from app.models import Package, PackageCounter, PackageType, UserSession  # noqa: E402
+
+
+class StatementCounter:
+    """
+    Считает SQL-запросы, отправленные в базу через движок.
+    """
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def reset(self) -> None:
+        self.statements.clear()
+
+
+@pytest.fixture
+async def sqlite_engine():
+    engine = create_async_engine(
+        "sqlite+aiosqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def db(sqlite_engine) -> AsyncSession:
+    session_maker = async_sessionmaker(sqlite_engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_maker() as session:
+        yield session
+
+
+@pytest.fixture
+async def user_session(db: AsyncSession) -> UserSession:
+    """
+    Сессия пользователя с десятью посылками двух типов и счетчиками посылок.
+    """
+    user_session = UserSession(session_id="test-session")
+    db.add_all([
+        user_session,
+        PackageType(id=1, name="одежда"),
+        PackageType(id=2, name="электроника"),
+    ])
+    await db.flush()
+
+    db.add_all([
+        Package(
+            id=package_id,
+            name=f"package-{package_id}",
+            weight=1.0,
+            price_usd=10.0,
+            package_type_id=1 + package_id % 2,
+            user_session_id=user_session.id,
+        )
+        for package_id in range(1, 11)
+    ])
+    db.add_all([
+        PackageCounter(
+            user_session_id=user_session.id,
+            package_type_id=package_type_id,
+            is_shipping_cost_calculated=False,
+            packages_count=5,
+        )
+        for package_type_id in (1, 2)
+    ])
+    await db.commit()
+    return user_session
+
+
+@pytest.fixture
+def statements(sqlite_engine) -> StatementCounter:
+    counter = StatementCounter()
+    event.listen(sqlite_engine.sync_engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(sqlite_engine.sync_engine, "before_cursor_execute", counter)
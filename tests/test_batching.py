@@ -0,0 +1,64 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+from app.workers.batching import MessageBatcher
+
+
+class FakeMessage:
+    """
+    Входящее сообщение RabbitMQ с порядковым номером.
+    """
+
+    def __init__(self, number: int):
+        self.number = number
+        self.processed = False
+        self.nack = AsyncMock()
+
+
+class RecordingHandler:
+    """
+    Обработчик пачек, запоминающий номера сообщений в каждой пачке.
+    Первая пачка обрабатывается, пока не будет установлен release.
+    """
+
+    def __init__(self):
+        self.batches: list[list[int]] = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, batch: list[FakeMessage]) -> None:
+        if not self.batches:
+            await self.release.wait()
+        self.batches.append([message.number for message in batch])
+
+
+async def test_batches_do_not_exceed_max_size():
+    handler = RecordingHandler()
+    batcher = MessageBatcher(handler, max_size=3, max_wait=0.01)
+
+    # Сообщения 3-6 приходят, пока обрабатывается первая пачка
+    tasks = [asyncio.create_task(batcher.add(FakeMessage(number))) for number in range(7)]
+    await asyncio.sleep(0)
+    handler.release.set()
+    await asyncio.gather(*tasks)
+    await asyncio.sleep(0.05)
+
+    assert handler.batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+async def test_close_flushes_pending_messages():
+    handler = RecordingHandler()
+    handler.release.set()
+    batcher = MessageBatcher(handler, max_size=3, max_wait=60)
+
+    for number in range(2):
+        await batcher.add(FakeMessage(number))
+    await batcher.close()
+
+    assert handler.batches == [[0, 1]]
+    assert batcher._timer is None
+
+    late = FakeMessage(2)
+    await batcher.add(late)
+
+    late.nack.assert_awaited_once_with(requeue=True)
+    assert handler.batches == [[0, 1]]
@@ -0,0 +1,47 @@
+import pytest
+
+from app.core.config import settings
+from app.services import currency
+from app.utils.cache import StaleWhileRevalidate
+
+CBR_RESPONSE = {
+    "Date": "2026-10-17T11:30:00+03:00",
+    "Valute": {
+        "USD": {"Nominal": 1, "Value": 92.5},
+        "KZT": {"Nominal": 100, "Value": 18.0},
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def redis_down(mocker):
+    """
+    Redis недоступен: чтения падают, записи ничего не делают.
+    """
+    mocker.patch.object(currency.redis_client, "pipeline", side_effect=ConnectionError("Redis is down"))
+    mocker.patch.object(currency, "get_cache", side_effect=ConnectionError("Redis is down"))
+    mocker.patch.object(currency, "set_cache", return_value=False)
+    mocker.patch.object(currency, "set_hash", return_value=False)
+
+
+@pytest.fixture
+def snapshot_cache(mocker) -> StaleWhileRevalidate:
+    cache = StaleWhileRevalidate(currency._load_currency_snapshot, ttl=settings.CURRENCY_L1_TTL)
+    mocker.patch.object(currency, "_currency_snapshot", cache)
+    return cache
+
+
+async def test_redis_outage_still_queries_providers(snapshot_cache, mocker):
+    mocker.patch.object(currency, "_fetch_rates", return_value=CBR_RESPONSE)
+
+    assert await currency.get_usd_to_rub_rate() == 92.5
+
+
+async def test_fallback_rate_is_not_kept_in_memory(snapshot_cache, mocker):
+    fetch_rates = mocker.patch.object(currency, "_fetch_rates", side_effect=ConnectionError("provider is down"))
+
+    assert await currency.get_usd_to_rub_rate() == settings.CURRENCY_FALLBACK_RATE
+
+    fetch_rates.side_effect = None
+    fetch_rates.return_value = CBR_RESPONSE
+    assert await currency.get_usd_to_rub_rate() == 92.5
@@ -0,0 +1,164 @@
+"""
+Планы запросов списка, курсорной пагинации, карточки и захвата посылок на MySQL.
+Нужна база из docker-compose с примененными миграциями (alembic upgrade head);
+без нее тесты пропускаются. Тестовые данные вставляются в транзакции,
+которая откатывается после теста.
+"""
+import uuid
+
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects import mysql as mysql_dialect
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+from app.models import Package, PackageType, UserSession
+from app.schemas.package import PackageFilter
+from app.services.package import (
+    _claimable_packages_query,
+    _filtered_packages_query,
+    _package_detail_query,
+)
+
+SESSIONS_COUNT = 10
+PACKAGES_PER_SESSION = 500
+
+FILTERS = [
+    None,
+    PackageFilter(package_type_id=1),
+    PackageFilter(has_shipping_cost=True),
+    PackageFilter(package_type_id=1, has_shipping_cost=False),
+]
+
+
+@pytest.fixture
+async def mysql() -> AsyncConnection:
+    engine = create_async_engine(
+        settings.SQLALCHEMY_DATABASE_URI,
+        poolclass=NullPool,
+        connect_args={"connect_timeout": 2},
+    )
+    try:
+        conn = await engine.connect()
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"MySQL is not available: {str(e)}")
+
+    migrated = await conn.scalar(
+        text(
+            "SELECT COUNT(*) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = 'packages' AND index_name = 'ix__packages__session_id'"
+        )
+    )
+    if not migrated:
+        await conn.close()
+        await engine.dispose()
+        pytest.skip("Migrations are not applied, run alembic upgrade head")
+
+    try:
+        yield conn
+    finally:
+        await conn.close()
+        await engine.dispose()
+
+
+@pytest.fixture
+async def user_session(mysql: AsyncConnection) -> UserSession:
+    """
+    Несколько сессий пользователей с посылками обоих типов, большая часть
+    которых рассчитана и закреплена за компаниями. Возвращает первую сессию.
+    """
+    await mysql.begin()
+
+    package_type_ids = (await mysql.scalars(select(PackageType.id).order_by(PackageType.id).limit(2))).all()
+    while len(package_type_ids) < 2:
+        result = await mysql.execute(insert(PackageType).values(name=f"explain-{uuid.uuid4().hex[:8]}"))
+        package_type_ids.append(result.inserted_primary_key[0])
+
+    user_session_ids = []
+    for _ in range(SESSIONS_COUNT):
+        result = await mysql.execute(insert(UserSession).values(session_id=f"explain-{uuid.uuid4().hex}"))
+        user_session_ids.append(result.inserted_primary_key[0])
+
+    await mysql.execute(
+        insert(Package),
+        [
+            dict(
+                name=f"explain-{user_session_id}-{i}",
+                weight=1.0,
+                price_usd=10.0,
+                package_type_id=package_type_ids[i % 2],
+                user_session_id=user_session_id,
+                is_shipping_cost_calculated=i % 4 != 0,
+                shipping_cost=100.0 if i % 4 else None,
+                shipping_company_id=i % 10 if i % 4 and i % 10 else None,
+            )
+            for user_session_id in user_session_ids
+            for i in range(PACKAGES_PER_SESSION)
+        ]
+    )
+
+    try:
+        yield UserSession(id=user_session_ids[0])
+    finally:
+        await mysql.rollback()
+
+
+async def explain(conn: AsyncConnection, query: Select) -> list[dict]:
+    sql = str(query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    result = await conn.exec_driver_sql(f"EXPLAIN {sql}")
+    return [dict(row) for row in result.mappings()]
+
+
+def assert_uses_index(plan: list[dict]) -> None:
+    """
+    Посылки читаются по индексу и уже в порядке ID: без полного сканирования и сортировки.
+    """
+    for row in plan:
+        if row["table"] == "packages":
+            assert row["type"] != "ALL", f"full scan of packages: {row}"
+        assert "filesort" not in (row["Extra"] or ""), f"filesort: {row}"
+        assert "temporary" not in (row["Extra"] or ""), f"temporary table: {row}"
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+async def test_list_plan(mysql, user_session, filters):
+    query = _filtered_packages_query(user_session, filters).order_by(Package.id).offset(100).limit(20)
+
+    assert_uses_index(await explain(mysql, query))
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+async def test_keyset_plan(mysql, user_session, filters):
+    query = (
+        _filtered_packages_query(user_session, filters)
+        .where(Package.id > 0)
+        .order_by(Package.id)
+        .limit(21)
+    )
+
+    assert_uses_index(await explain(mysql, query))
+
+
+async def test_detail_plan(mysql, user_session):
+    package_id = await mysql.scalar(
+        select(Package.id).where(Package.user_session_id == user_session.id).limit(1)
+    )
+
+    plan = await explain(mysql, _package_detail_query(package_id))
+
+    assert {row["type"] for row in plan} <= {"const", "eq_ref"}, plan
+
+
+async def test_claim_plan(mysql, user_session):
+    assert_uses_index(await explain(mysql, _claimable_packages_query(20)))
+
+
+def test_claim_query_compares_flag_by_equality():
+    # IS true не используется MySQL как равенство по индексу; проверка не требует базы
+    sql = str(_claimable_packages_query(20).compile(dialect=mysql_dialect.dialect()))
+
+    assert "packages.is_shipping_cost_calculated = " in sql
+    assert " IS true" not in sql
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from app.utils.metrics import METRICS_MAX_HEADERS, METRICS_MAX_LINE_BYTES, start_metrics_server
+
+
+@pytest.fixture
+async def metrics_port() -> int:
+    server = await start_metrics_server("127.0.0.1", 0, read_timeout=0.1)
+    yield server.sockets[0].getsockname()[1]
+    server.close()
+    await server.wait_closed()
+
+
+async def request(port: int, data: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    response = await asyncio.wait_for(reader.read(), 1)
+    writer.close()
+    return response
+
+
+async def test_metrics(metrics_port):
+    response = await request(metrics_port, b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+
+    assert response.startswith(b"HTTP/1.1 200 OK")
+
+
+async def test_slow_client_is_disconnected(metrics_port):
+    # Запрос не дописан: соединение закрывается по таймауту без ответа
+    assert await request(metrics_port, b"GET /metrics HTTP/1.1\r\n") == b""
+
+
+async def test_too_many_headers(metrics_port):
+    headers = b"".join(b"X-Header-%d: 1\r\n" % number for number in range(METRICS_MAX_HEADERS + 1))
+
+    response = await request(metrics_port, b"GET /metrics HTTP/1.1\r\n" + headers + b"\r\n")
+
+    assert response.startswith(b"HTTP/1.1 431")
+
+
+async def test_too_long_line(metrics_port):
+    response = await request(metrics_port, b"GET /" + b"x" * METRICS_MAX_LINE_BYTES + b" HTTP/1.1\r\n\r\n")
+
+    assert response.startswith(b"HTTP/1.1 431")
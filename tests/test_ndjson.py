@@ -0,0 +1,83 @@
+"""
+Потоковый разбор тел массовой регистрации: результат не зависит от того,
+как тело разбито на фрагменты, а размеры строк и тела ограничены.
+"""
+import json
+
+import pytest
+
+from app.utils.ndjson import (
+    BodyTooLarge,
+    ItemTooLarge,
+    iter_json_array,
+    iter_ndjson_lines,
+    limit_body,
+)
+
+ITEMS = [{"name": "посылка", "weight": 1.5}, 123, [1, {"a": "]"}], "x,y", None]
+
+
+async def split(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+async def collect(iterator) -> list:
+    return [item async for item in iterator]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+async def test_ndjson_lines(size):
+    body = b'{"a": 1}\n\n  \n{"b": 2}\r\n{"c": 3}'
+
+    lines = await collect(iter_ndjson_lines(split(body, size), max_line_bytes=100))
+
+    assert [(line_no, json.loads(line)) for line_no, line in lines] == [
+        (1, {"a": 1}), (4, {"b": 2}), (5, {"c": 3})
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+async def test_ndjson_line_too_large(size):
+    body = b'{"a": 1}\n' + b"x" * 50 + b"\n"
+
+    with pytest.raises(ItemTooLarge) as error:
+        await collect(iter_ndjson_lines(split(body, size), max_line_bytes=20))
+
+    assert error.value.line_no == 2
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+async def test_json_array(size):
+    body = json.dumps(ITEMS, ensure_ascii=False).encode()
+
+    items = await collect(iter_json_array(split(body, size), max_item_bytes=100))
+
+    assert items == list(enumerate(ITEMS, start=1))
+
+
+@pytest.mark.parametrize("body", [b"[]", b" [ ] \n"])
+async def test_json_array_empty(body):
+    assert await collect(iter_json_array(split(body, 1), max_item_bytes=100)) == []
+
+
+@pytest.mark.parametrize("body", [b"{}", b"[1,]", b"[1 2]", b"[1", b"[1] 2", b'["a'])
+async def test_json_array_invalid(body):
+    with pytest.raises(ValueError):
+        await collect(iter_json_array(split(body, 1), max_item_bytes=100))
+
+
+async def test_json_array_item_too_large():
+    body = json.dumps([1, "x" * 50]).encode()
+
+    with pytest.raises(ItemTooLarge) as error:
+        await collect(iter_json_array(split(body, 4), max_item_bytes=20))
+
+    assert error.value.line_no == 2
+
+
+async def test_limit_body():
+    assert await collect(limit_body(split(b"x" * 10, 3), max_bytes=10)) == [b"xxx", b"xxx", b"xxx", b"x"]
+
+    with pytest.raises(BodyTooLarge):
+        await collect(limit_body(split(b"x" * 11, 3), max_bytes=10))
@@ -0,0 +1,146 @@
+import json
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.core.config import settings
+from app.workers.package_processor import DEAD_LETTER_ROUTING_KEY, PackageProcessor
+
+
+class FakeMessage:
+    """
+    Входящее сообщение RabbitMQ, запоминающее ack/nack/reject.
+    """
+
+    def __init__(self, data: dict, routing_key: str = "package.create", headers: dict | None = None):
+        self.body = json.dumps(data).encode()
+        self.routing_key = routing_key
+        self.headers = headers or {}
+        self.processed = False
+        self.ack = AsyncMock()
+        self.nack = AsyncMock()
+        self.reject = AsyncMock()
+
+
+def create_message(user_session_id: int, package_id: int, **kwargs) -> FakeMessage:
+    return FakeMessage(
+        {
+            "package_data": {
+                "package_id": package_id,
+                "name": f"package-{package_id}",
+                "weight": 1.0,
+                "price_usd": 10.0,
+                "package_type_id": 1,
+                "user_session_id": user_session_id,
+            }
+        },
+        **kwargs
+    )
+
+
+def database_error() -> OperationalError:
+    return OperationalError("INSERT INTO packages", {}, ConnectionError("MySQL server has gone away"))
+
+
+@pytest.fixture
+def processor() -> PackageProcessor:
+    processor = PackageProcessor(session_maker=None)
+    processor.exchange = AsyncMock()
+    return processor
+
+
+async def test_create_batch_database_error_is_retried(processor, mocker):
+    mocker.patch.object(processor, "_create_packages", side_effect=database_error())
+    messages = [create_message(1, package_id) for package_id in (1, 2, 3)]
+
+    await processor.process_create_batch(messages)
+
+    for message in messages:
+        message.ack.assert_not_called()
+        message.nack.assert_awaited_once_with(requeue=False)
+    processor.exchange.publish.assert_not_called()
+
+
+async def test_single_create_message_database_error_is_retried(processor, mocker):
+    mocker.patch.object(processor, "_create_packages", side_effect=database_error())
+    message = create_message(1, 1)
+
+    await processor.process_message(message)
+
+    message.ack.assert_not_called()
+    message.nack.assert_awaited_once_with(requeue=False)
+
+
+async def test_create_message_is_dead_lettered_after_max_retries(processor, mocker):
+    mocker.patch.object(processor, "_create_packages", side_effect=database_error())
+    message = create_message(
+        1, 1,
+        headers={"x-death": [{"reason": "rejected", "count": settings.WORKER_MAX_RETRIES}]}
+    )
+
+    await processor.process_create_batch([message])
+
+    message.nack.assert_not_called()
+    assert processor.exchange.publish.await_args.kwargs["routing_key"] == DEAD_LETTER_ROUTING_KEY
+    message.ack.assert_awaited_once()
+
+
+async def test_poison_message_is_isolated(processor, mocker):
+    async def create_packages(items):
+        if any(package_id == 2 for package_id, *_ in items):
+            raise IntegrityError("INSERT INTO packages", {}, ValueError("bad package"))
+        return {1}
+
+    mocker.patch.object(processor, "_create_packages", side_effect=create_packages)
+    good, poison = create_message(1, 1), create_message(1, 2)
+
+    await processor.process_create_batch([good, poison])
+
+    good.ack.assert_awaited_once()
+    good.nack.assert_not_called()
+    assert processor.exchange.publish.await_count == 1
+    assert processor.exchange.publish.await_args.kwargs["routing_key"] == DEAD_LETTER_ROUTING_KEY
+    poison.ack.assert_awaited_once()
+
+
+async def test_invalid_message_is_dead_lettered_not_retried(processor):
+    message = FakeMessage({"unexpected": True})
+
+    await processor.process_create_batch([message])
+
+    message.nack.assert_not_called()
+    message.reject.assert_not_called()
+    assert processor.exchange.publish.await_args.kwargs["routing_key"] == DEAD_LETTER_ROUTING_KEY
+    message.ack.assert_awaited_once()
+
+
+async def test_calculate_batch_database_error_is_retried(processor, mocker):
+    mocker.patch.object(processor, "_calculate_shipping_costs", side_effect=database_error())
+    messages = [
+        FakeMessage({"package_ids": [1, 2]}, "package.calculate"),
+        FakeMessage({"package_id": 3}, "package.calculate"),
+    ]
+
+    await processor.process_calculate_batch(messages)
+
+    for message in messages:
+        message.ack.assert_not_called()
+        message.nack.assert_awaited_once_with(requeue=False)
+
+
+async def test_calculate_poison_message_is_isolated(processor, mocker):
+    async def calculate(package_ids):
+        if 3 in package_ids:
+            raise ValueError("bad package")
+        return {package_id: 100.0 for package_id in package_ids}
+
+    mocker.patch.object(processor, "_calculate_shipping_costs", side_effect=calculate)
+    good = FakeMessage({"package_ids": [1, 2]}, "package.calculate")
+    poison = FakeMessage({"package_id": 3}, "package.calculate")
+
+    await processor.process_calculate_batch([good, poison])
+
+    good.ack.assert_awaited_once()
+    assert processor.exchange.publish.await_args.kwargs["routing_key"] == DEAD_LETTER_ROUTING_KEY
+    poison.nack.assert_not_called()
@@ -0,0 +1,87 @@
+"""
+Количество SQL-запросов на горячих путях API. Связи моделей объявлены с lazy="raise",
+поэтому неявная подгрузка падает, а эти тесты ловят появление лишних запросов.
+"""
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import Package, UserSession
+from app.schemas.package import PackageFilter
+from app.services import package as package_service
+from app.services import user_session as user_session_service
+
+
+@pytest.fixture(autouse=True)
+def no_redis(mocker):
+    """
+    Redis недоступен в тестах: каждое чтение кэша - промах, запись ничего не делает.
+    """
+    for module in (package_service, user_session_service):
+        mocker.patch.object(module, "get_cache", return_value=None)
+        mocker.patch.object(module, "set_cache", return_value=True)
+
+
+async def test_resolve_session_id(db, user_session, statements):
+    assert await user_session_service.resolve_session_id(db, "test-session") == user_session.id
+    assert statements.count == 1
+
+    # Повторное обращение обслуживается кэшем в памяти процесса
+    statements.reset()
+    assert await user_session_service.resolve_session_id(db, "test-session") == user_session.id
+    assert statements.count == 0
+
+
+async def test_get_package_detail(db, user_session, statements):
+    data = await package_service.get_package_detail(db, 3, user_session)
+
+    assert data["name"] == "package-3"
+    assert data["package_type_name"] == "электроника"
+    assert statements.count == 1
+
+
+async def test_get_packages(db, user_session, statements):
+    packages, total = await package_service.get_packages(db, user_session, limit=100)
+
+    assert [row.id for row in packages] == list(range(1, 11))
+    assert {row.package_type_name for row in packages} == {"одежда", "электроника"}
+    assert total == 10
+    # Страница и общее количество по счетчикам, независимо от числа посылок
+    assert statements.count == 2
+
+
+async def test_get_packages_after(db, user_session, statements):
+    packages, next_id, total = await package_service.get_packages_after(
+        db, user_session, after_id=4, limit=3, filters=PackageFilter(package_type_id=1)
+    )
+
+    assert [row.id for row in packages] == [6, 8, 10]
+    assert next_id is None
+    assert total is None
+    assert statements.count == 1
+
+
+async def test_relationships_are_not_lazy_loaded(db, user_session):
+    package = await db.scalar(select(Package).where(Package.id == 1))
+
+    with pytest.raises(InvalidRequestError):
+        package.package_type
+
+
+async def test_activity_flush_is_chunked(db, sqlite_engine, statements):
+    db.add_all([UserSession(id=session_id, session_id=f"session-{session_id}") for session_id in range(1, 8)])
+    await db.commit()
+    tracker = user_session_service.SessionActivityTracker(
+        async_sessionmaker(sqlite_engine, class_=AsyncSession), granularity=60, chunk_size=3
+    )
+    for session_id in range(1, 8):
+        tracker.touch(session_id)
+
+    statements.reset()
+    assert await tracker.flush() == 7
+    assert sum(statement.startswith("UPDATE") for statement in statements.statements) == 3
+
+    # Всем сессиям записывается одно время сброса
+    db.expire_all()
+    assert len(set((await db.scalars(select(UserSession.last_activity))).all())) == 1
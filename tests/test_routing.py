@@ -0,0 +1,39 @@
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import routing
+from app.db.base import read_engine
+from app.models import Package
+
+
+def make_router(lags: list[int | None]) -> routing.ReplicaRouter:
+    router = routing.ReplicaRouter(read_engine, [], max_lag=30)
+    router.replicas = [create_async_engine(f"sqlite+aiosqlite:///replica{i}.db") for i in range(len(lags))]
+    lag_by_replica = dict(zip(router.replicas, lags))
+
+    async def replication_lag(replica):
+        return lag_by_replica[replica]
+
+    router._replication_lag = replication_lag
+    return router
+
+
+async def test_lagging_and_stopped_replicas_are_excluded():
+    router = make_router([1, 120, None])
+
+    await router.check()
+
+    assert router._healthy == router.replicas[:1]
+
+
+async def test_session_is_pinned_to_one_replica(mocker):
+    router = make_router([0, 0])
+    await router.check()
+    mocker.patch.object(routing, "replica_router", router)
+
+    session = routing.ReplicaRoutingSession()
+    binds = {session.get_bind(clause=select(Package.id)) for _ in range(4)}
+
+    assert len(binds) == 1
+    assert binds <= {replica.sync_engine for replica in router.replicas}
+    assert session.get_bind(clause=update(Package).values(name="x")) is read_engine.sync_engine